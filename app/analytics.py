@@ -0,0 +1,183 @@
+"""Cross-customer spending analytics over the stored line items.
+
+The matching line items are loaded once into a LineItemColumns (days, cents and
+dictionary codes computed on the server) and every report is a NumPy group-by
+over those arrays: category totals, monthly trends, top merchants and
+per-customer percentiles. Amounts are summed as integer cents.
+
+Usage:
+    python -m app.analytics categories
+    python -m app.analytics monthly --customer "Joseph Paulson" --start 2024-01-01
+    python -m app.analytics merchants --limit 20
+    python -m app.analytics customers
+"""
+import argparse
+import json
+import os
+from datetime import date
+
+import numpy as np
+
+from .document_store import load_line_item_columns
+from .line_items import MISSING_DAY
+from .merchant_categories import normalize_merchant
+
+ANALYTICS_TOP_MERCHANTS = int(os.getenv('ANALYTICS_TOP_MERCHANTS', '10'))
+ANALYTICS_PERCENTILES = (50, 90, 99)
+
+def _grouped(codes, cents, size):
+    """Total cents and item count per code; code -1 (no value) is dropped"""
+    codes = np.asarray(codes)
+    known = codes >= 0
+    if not known.all():
+        codes, cents = codes[known], cents[known]
+    totals = np.bincount(codes, weights=cents, minlength=size)
+    counts = np.bincount(codes, minlength=size)
+    return totals, counts
+
+def load(customer_names=None, categories=None, start_date: date = None, end_date: date = None):
+    """Load the line items matching the filters for the reports below"""
+    return load_line_item_columns(customer_names, categories, start_date, end_date)
+
+def category_totals(columns):
+    """Spend and item count per category, largest spend first"""
+    arrays = columns.to_numpy()
+    totals, counts = _grouped(arrays['category_codes'], arrays['cents'], len(columns.categories))
+    order = np.argsort(-totals, kind='stable')
+    return [
+        {'category': columns.categories[code], 'total': float(totals[code]) / 100, 'count': int(counts[code])}
+        for code in order if counts[code]
+    ]
+
+def monthly_trends(columns, by_category=False):
+    """Spend per month (YYYY-MM), overall or per category, in month order"""
+    arrays = columns.to_numpy()
+    dated = arrays['days'] != MISSING_DAY
+    months = arrays['days'][dated].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    cents = arrays['cents'][dated]
+    # Months present, as codes counted from the first one
+    first_month = months.min() if len(months) else 0
+    month_codes = months - first_month
+    month_counts = np.bincount(month_codes)
+    present = np.flatnonzero(month_counts)
+    labels = [str(np.datetime64(int(first_month + code), 'M')) for code in present]
+    remap = np.zeros(len(month_counts), dtype=np.int64)
+    remap[present] = np.arange(len(present))
+    month_codes = remap[month_codes]
+    if not by_category:
+        totals, _ = _grouped(month_codes, cents, len(labels))
+        return {label: float(totals[index]) / 100 for index, label in enumerate(labels)}
+
+    if not labels or not columns.categories:
+        return {}
+    category_codes = arrays['category_codes'][dated]
+    known = category_codes >= 0
+    size = len(labels) * len(columns.categories)
+    totals, counts = _grouped(month_codes[known] * len(columns.categories) + category_codes[known],
+                              cents[known], size)
+    totals = totals.reshape(len(labels), -1)
+    counts = counts.reshape(len(labels), -1)
+    return {
+        label: {columns.categories[code]: float(totals[index, code]) / 100
+                for code in range(len(columns.categories)) if counts[index, code]}
+        for index, label in enumerate(labels)
+    }
+
+def top_merchants(columns, limit=ANALYTICS_TOP_MERCHANTS):
+    """Merchants with the largest spend; descriptions are grouped by their normalized merchant"""
+    arrays = columns.to_numpy()
+    # Normalize each distinct description once, then map description codes to merchant codes
+    merchants = []
+    merchant_codes = {}
+    description_to_merchant = np.empty(len(columns.descriptions), dtype=np.int32)
+    for code, description in enumerate(columns.descriptions):
+        merchant = normalize_merchant(description) or description
+        if merchant not in merchant_codes:
+            merchant_codes[merchant] = len(merchants)
+            merchants.append(merchant)
+        description_to_merchant[code] = merchant_codes[merchant]
+
+    description_codes = arrays['description_codes']
+    known = description_codes >= 0
+    totals, counts = _grouped(description_to_merchant[description_codes[known]], arrays['cents'][known], len(merchants))
+    order = np.argsort(-totals, kind='stable')[:limit]
+    return [
+        {'merchant': merchants[code], 'total': float(totals[code]) / 100, 'count': int(counts[code])}
+        for code in order if counts[code]
+    ]
+
+def customer_percentiles(columns, percentiles=ANALYTICS_PERCENTILES):
+    """Per customer: total spend, item count, transaction amount percentiles, and the
+    percentile rank of the customer's total among all customers"""
+    arrays = columns.to_numpy()
+    customer_codes = arrays['customer_codes']
+    cents = arrays['cents']
+    size = len(columns.customers)
+    totals, counts = _grouped(customer_codes, cents, size)
+
+    # Sort amounts within each customer, then read the percentiles by position
+    known = customer_codes >= 0
+    codes, known_cents = customer_codes[known].astype(np.int64), cents[known]
+    low = known_cents.min() if len(known_cents) else 0
+    span = int(known_cents.max() - low + 1) if len(known_cents) else 1
+    if size * span < 2 ** 62:
+        # One sort over a combined (customer, amount) key is much faster than lexsort
+        sorted_cents = (np.sort(codes * span + (known_cents - low)) % span + low).astype(np.float64)
+    else:
+        sorted_cents = known_cents[np.lexsort((known_cents, codes))].astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    amount_percentiles = {}
+    for q in percentiles:
+        # Linear interpolation between the closest ranks, as numpy.percentile does
+        position = starts[present] + (counts[present] - 1) * (q / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, starts[present] + counts[present] - 1)
+        fraction = position - lower
+        amount_percentiles[q] = sorted_cents[lower] + (sorted_cents[upper] - sorted_cents[lower]) * fraction
+
+    present_totals = totals[present]
+    ranked = np.sort(present_totals)
+    ranks = np.searchsorted(ranked, present_totals, side='right') / len(ranked) * 100 if len(ranked) else ranked
+
+    results = []
+    for index, code in enumerate(np.flatnonzero(present)):
+        results.append({
+            'customer_name': columns.customers[code],
+            'total': float(totals[code]) / 100,
+            'count': int(counts[code]),
+            'amount_percentiles': {f'p{q}': float(amount_percentiles[q][index]) / 100 for q in percentiles},
+            'total_percentile_rank': float(ranks[index]),
+        })
+    results.sort(key=lambda row: row['total'], reverse=True)
+    return results
+
+REPORTS = {
+    'categories': category_totals,
+    'monthly': monthly_trends,
+    'merchants': top_merchants,
+    'customers': customer_percentiles,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Spending analytics across all customers")
+    parser.add_argument('report', choices=sorted(REPORTS))
+    parser.add_argument('--customer', action='append', help="Customer to include (repeatable; default all)")
+    parser.add_argument('--category', action='append', help="Category to include (repeatable; default all)")
+    parser.add_argument('--start', type=date.fromisoformat, help="First spend date, YYYY-MM-DD")
+    parser.add_argument('--end', type=date.fromisoformat, help="Last spend date, YYYY-MM-DD")
+    parser.add_argument('--limit', type=int, default=ANALYTICS_TOP_MERCHANTS, help="Merchants to list")
+    parser.add_argument('--by-category', action='store_true', help="Split monthly trends by category")
+    args = parser.parse_args()
+
+    columns = load(args.customer, args.category, args.start, args.end)
+    if args.report == 'merchants':
+        result = top_merchants(columns, args.limit)
+    elif args.report == 'monthly':
+        result = monthly_trends(columns, args.by_category)
+    else:
+        result = REPORTS[args.report](columns)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
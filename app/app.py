@@ -1,9 +1,17 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+import hashlib
+import tempfile
+from datetime import date
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, abort, stream_with_context
 from werkzeug.utils import secure_filename
-import pandas as pd
 import json
-from .main import main as process_pdf
+from .jobs import submit_job, get_job
+from .document_store import get_document_version, get_document_line_items
+from .extraction_cache import LRUCache
+from .export import EXPORT_FORMATS, iter_export
+from .pdf_retrieval import iter_customer_pdfs_zip
+from .results_cache import results_cache_stats
+from . import metrics
 
 app = Flask(__name__)
 
@@ -14,11 +22,46 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Requests larger than this are rejected with 413 before the body is read
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', '50')) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Dashboard payloads, cached per document version
+DASHBOARD_CACHE_SIZE = int(os.getenv('DASHBOARD_CACHE_SIZE', '128'))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+dashboard_cache = LRUCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=None)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_upload(file, upload_folder, max_size=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Stream an uploaded file to disk in chunks, hashing it on the way.
+
+    Returns the saved path and the SHA-256 of its content. The file is named after
+    its hash, so identical uploads share one file on disk.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(dir=upload_folder, suffix='.part', delete=False)
+    try:
+        with tmp:
+            for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+                size += len(chunk)
+                if max_size and size > max_size:
+                    # Chunked requests have no Content-Length for Flask to check up front
+                    abort(413)
+                digest.update(chunk)
+                tmp.write(chunk)
+        content_hash = digest.hexdigest()
+        filepath = os.path.join(upload_folder, f"{content_hash[:16]}_{secure_filename(file.filename)}")
+        os.replace(tmp.name, filepath)
+        return filepath, content_hash
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -31,143 +74,165 @@ def upload_file():
     if file.filename == '':
         return redirect(request.url)
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with metrics.span('pdf_save'):
+            filepath, content_hash = save_upload(file, app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH'])
         
-        # Process the uploaded PDF using the main function
-        try:
-            # Process the PDF and get CSV filename and spend line items
-            csv_filename, spend_line_items = process_pdf(filepath)
-            
-            if csv_filename:
-                # Redirect to dashboard with the CSV filename
-                return redirect(url_for('dashboard', filename=csv_filename))
-            else:
-                return "No spend items found in the uploaded document."
-        except Exception as e:
-            return f"An error occurred while processing the file: {str(e)}"
+        # Queue the PDF for OCR and extraction instead of processing it in the request thread
+        job_id = submit_job(filepath, content_hash=content_hash)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+        return render_template('job.html', job_id=job_id)
     return redirect(request.url)
 
-@app.route('/dashboard/<path:filename>')
-def dashboard(filename):
-    return render_template('dashboard.html', csv_file=filename)
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': f'Job not found: {job_id}'}), 404
+    if job['status'] == 'done' and job['item_count']:
+        job['dashboard_url'] = url_for('dashboard', document_id=job['document_id'])
+    job['created_at'] = job['created_at'].isoformat()
+    job['updated_at'] = job['updated_at'].isoformat()
+    return jsonify(job)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/results-cache')
+def results_cache_endpoint():
+    """Hit ratio, evictions and size of the summary results cache"""
+    return jsonify(results_cache_stats())
+
+@app.route('/dashboard/<document_id>')
+def dashboard(document_id):
+    return render_template('dashboard.html', document_id=document_id)
+
+def _series(grouped):
+    return {'labels': grouped.index.tolist(), 'values': grouped.values.tolist()}
+
+def build_dashboard_data(line_items):
+    """Compute chart series and the transaction table for a document's line items."""
+    import pandas as pd
 
-@app.route('/get_data/<path:filename>')
-def get_data(filename):
+    df = pd.DataFrame.from_records(line_items, columns=['spend_date', 'spend_description', 'amount', 'category'])
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0.0)
+
+    category = df.groupby('category', sort=True)['amount'].sum()
+    dates = pd.to_datetime(df['spend_date'], errors='coerce')
+    by_date = df.loc[dates.notna(), 'amount'].groupby(dates[dates.notna()].dt.strftime('%Y-%m-%d')).sum()
+    merchant = df.groupby('spend_description')['amount'].sum().nlargest(10)
+
+    df['spend_date'] = df['spend_date'].fillna('Unknown Date')
+    return {
+        'category': _series(category),
+        'date': _series(by_date),
+        'merchant': _series(merchant),
+        'total': float(df['amount'].sum()),
+        'transactions': df.to_dict('records'),
+    }
+
+@app.route('/get_data/<document_id>')
+def get_data(document_id):
     try:
-        # Print debug info
-        print(f"Loading CSV: {filename}")
-        
-        # Ensure file exists
-        if not os.path.exists(filename):
-            print(f"File does not exist: {filename}")
-            return jsonify({'error': f'File not found: {filename}'})
-            
-        # Read CSV file
-        df = pd.read_csv(filename)
-        print(f"CSV loaded successfully. Columns: {df.columns.tolist()}")
-        print(f"Data types: {df.dtypes}")
-        print(f"First few rows: \n{df.head()}")
-        
-        # Check if required columns exist
-        required_columns = ['spend_date', 'spend_description', 'amount', 'category']
-        for col in required_columns:
-            if col not in df.columns:
-                print(f"Missing column: {col}")
-                return jsonify({'error': f'Missing column: {col}. Required columns: {required_columns}'})
-        
-        # Prepare data for charts
-        # Handle category data
-        try:
-            category_data = df.groupby('category')['amount'].sum().reset_index()
-            category_labels = category_data['category'].tolist()
-            category_values = category_data['amount'].tolist()
-            print(f"Categories found: {category_labels}")
-        except Exception as e:
-            print(f"Error in category processing: {str(e)}")
-            category_labels = ['Other']
-            category_values = [df['amount'].sum() if 'amount' in df else 0]
-        
-        # Handle date data with error checking
-        try:
-            # Convert to datetime safely
-            df['spend_date'] = pd.to_datetime(df['spend_date'], errors='coerce')
-            
-            # Drop any rows with invalid dates
-            df = df.dropna(subset=['spend_date'])
-            
-            # Group by date
-            if not df.empty:
-                date_data = df.groupby('spend_date')['amount'].sum().reset_index()
-                date_labels = date_data['spend_date'].dt.strftime('%Y-%m-%d').tolist()
-                date_values = date_data['amount'].tolist()
-            else:
-                date_labels = []
-                date_values = []
-            print(f"Dates found: {date_labels}")
-        except Exception as e:
-            print(f"Error in date processing: {str(e)}")
-            date_labels = []
-            date_values = []
-        
-        # Handle merchant data
-        try:
-            merchant_data = df.groupby('spend_description')['amount'].sum().reset_index().sort_values('amount', ascending=False).head(10)
-            merchant_labels = merchant_data['spend_description'].tolist()
-            merchant_values = merchant_data['amount'].tolist()
-            print(f"Top merchants found: {merchant_labels[:3]}")
-        except Exception as e:
-            print(f"Error in merchant processing: {str(e)}")
-            merchant_labels = ['No data']
-            merchant_values = [0]
-        
-        # Calculate total amount
-        try:
-            total_spent = df['amount'].sum()
-            print(f"Total spent: {total_spent}")
-        except Exception as e:
-            print(f"Error calculating total: {str(e)}")
-            total_spent = 0
-        
-        # Format transaction data for the table
-        transactions = []
-        try:
-            for _, row in df.iterrows():
-                if pd.notna(row.get('spend_date')):
-                    date_str = row['spend_date'].strftime('%Y-%m-%d')
-                else:
-                    date_str = 'Unknown Date'
-                    
-                transactions.append({
-                    'spend_date': date_str,
-                    'spend_description': row['spend_description'],
-                    'amount': float(row['amount']),
-                    'category': row['category']
-                })
-        except Exception as e:
-            print(f"Error formatting transactions: {str(e)}")
-        
-        # Return the prepared data
-        return jsonify({
-            'category': {
-                'labels': category_labels,
-                'values': category_values
-            },
-            'date': {
-                'labels': date_labels,
-                'values': date_values
-            },
-            'merchant': {
-                'labels': merchant_labels,
-                'values': merchant_values
-            },
-            'total': total_spent,
-            'transactions': transactions
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = min(max(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+        # The document's last update identifies the version; a cheap point read
+        updated_at = get_document_version(document_id)
+        if updated_at is None:
+            return jsonify({'error': f'Document not found: {document_id}'}), 404
+        version = f"{document_id}-{updated_at.timestamp()}"
+        etag = f"{version}-{page}-{page_size}"
+        if etag in request.if_none_match:
+            return '', 304
+
+        data = dashboard_cache.get(version)
+        if data is None:
+            line_items = get_document_line_items(document_id) or []
+            data = build_dashboard_data(line_items)
+            dashboard_cache.put(version, data)
+
+        start = (page - 1) * page_size
+        transactions = data['transactions'][start:start + page_size]
+        response = jsonify({
+            'category': data['category'],
+            'date': data['date'],
+            'merchant': data['merchant'],
+            'total': data['total'],
+            'transactions': transactions,
+            'page': page,
+            'page_size': page_size,
+            'total_transactions': len(data['transactions']),
+            'has_more': start + page_size < len(data['transactions'])
         })
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
     except Exception as e:
         print(f"Global error in get_data: {str(e)}")
-        return jsonify({'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+def _line_item_filters():
+    """Customer, category and date range filters from the query string; raises ValueError on a bad date"""
+    try:
+        start_date = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end_date = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError as e:
+        raise ValueError(f'Invalid date: {e}')
+    return {
+        'customer_names': request.args.getlist('customer') or None,
+        'categories': request.args.getlist('category') or None,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+@app.route('/export/transactions')
+def export_transactions():
+    """Stream line items as CSV, NDJSON or Parquet, filtered by customer, category and date range"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    try:
+        filters = _line_item_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    chunks = iter_export(fmt, **filters)
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=transactions.{extension}'})
+
+@app.route('/analytics/<report>')
+def analytics_report(report):
+    """Category totals, monthly trends, top merchants or customer percentiles across customers, as JSON"""
+    # NumPy is only needed once analytics are requested
+    from . import analytics
+
+    if report not in analytics.REPORTS:
+        return jsonify({'error': f'Unknown report: {report}'}), 404
+    try:
+        filters = _line_item_filters()
+        limit = int(request.args.get('limit', analytics.ANALYTICS_TOP_MERCHANTS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    columns = analytics.load(**filters)
+    if report == 'merchants':
+        result = analytics.top_merchants(columns, limit)
+    elif report == 'monthly':
+        result = analytics.monthly_trends(columns, request.args.get('by') == 'category')
+    else:
+        result = analytics.REPORTS[report](columns)
+    return jsonify({'report': report, 'line_items': len(columns), 'data': result})
+
+@app.route('/customers/<customer_name>/pdfs.zip')
+def download_customer_pdfs(customer_name):
+    """Stream all PDFs of a customer as a single ZIP"""
+    archive_name = secure_filename(customer_name) or 'customer'
+    return Response(stream_with_context(iter_customer_pdfs_zip(customer_name)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={archive_name}_pdfs.zip'})
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,218 @@
+"""Batch ingestion of whole directories of statement PDFs.
+
+Usage:
+    python -m app.batch_ingest data/pdfs
+    python -m app.batch_ingest "data/pdfs/2023/*.pdf" --ocr-workers 2 --llm-workers 8
+
+OCR and LLM extraction run as a pipeline with separate concurrency limits, and
+stored statements are written to Mongo in bulk. Completed files are recorded in a
+checkpoint file so an interrupted run can be resumed, and failures are written to
+a retry list instead of aborting the run.
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+
+from .text_extraction import get_page_count
+from .extraction_cache import file_sha256, get_statement, cached_markdown, cached_statement
+from .document_store import build_document, BulkDocumentWriter, ensure_indexes
+
+DEFAULT_CHECKPOINT = 'data/batch_checkpoint.txt'
+DEFAULT_RETRY_LIST = 'data/batch_retry.jsonl'
+
+_DONE = object()
+
+def find_pdfs(source):
+    """Return the PDFs in a directory (recursively) or matching a glob, in sorted order"""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, '**', '*.pdf'), recursive=True)
+        paths += glob.glob(os.path.join(source, '**', '*.PDF'), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(set(os.path.normpath(path) for path in paths))
+
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        return set(line.strip() for line in f if line.strip())
+
+class BatchStats:
+    """Thread-safe throughput counters for a batch run"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.docs = 0
+        self.pages = 0
+        self.tokens = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def add(self, docs=0, pages=0, tokens=0, failures=0):
+        with self._lock:
+            self.docs += docs
+            self.pages += pages
+            self.tokens += tokens
+            self.failures += failures
+
+    def summary(self):
+        minutes = max(time.time() - self.start_time, 1e-9) / 60
+        with self._lock:
+            return (f"{self.docs} docs, {self.failures} failed | "
+                    f"{self.docs / minutes:.1f} docs/min, {self.pages / minutes:.1f} pages/min, "
+                    f"{self.tokens / minutes:.0f} tokens/min")
+
+class BatchIngestor:
+    def __init__(self, ocr_workers=1, llm_workers=4, batch_size=50, model_name="openai",
+                 checkpoint_path=DEFAULT_CHECKPOINT, retry_path=DEFAULT_RETRY_LIST):
+        self.ocr_workers = ocr_workers
+        self.llm_workers = llm_workers
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.checkpoint_path = checkpoint_path
+        self.retry_path = retry_path
+        self.stats = BatchStats()
+        self._file_lock = threading.Lock()
+
+    def _record_failure(self, path, stage, error):
+        self.stats.add(failures=1)
+        print(f"Failed ({stage}): {path}: {error}")
+        with self._file_lock:
+            with open(self.retry_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'path': path, 'stage': stage, 'error': str(error)}) + '\n')
+
+    def _record_done(self, paths):
+        with self._file_lock:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+                for path in paths:
+                    f.write(path + '\n')
+
+    def _ocr_worker(self, pending, llm_queue):
+        while True:
+            try:
+                path = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                content_hash = file_sha256(path)
+                pages = get_page_count(path)
+                # PDFs whose statement is cached need no markdown
+                markdown = None
+                if get_statement(content_hash, self.model_name) is None:
+                    markdown = cached_markdown(path, content_hash)
+                llm_queue.put((path, content_hash, pages, markdown))
+            except Exception as e:
+                traceback.print_exc()
+                self._record_failure(path, 'ocr', e)
+
+    def _llm_worker(self, llm_queue, store_queue):
+        while True:
+            item = llm_queue.get()
+            if item is _DONE:
+                return
+            path, content_hash, pages, markdown = item
+            try:
+                report = []
+                statement = cached_statement(path, content_hash, self.model_name, markdown=markdown, report=report)
+                tokens = sum((entry['prompt_tokens'] or 0) + (entry['completion_tokens'] or 0) for entry in report)
+                store_queue.put((path, content_hash, pages, tokens, statement))
+            except Exception as e:
+                traceback.print_exc()
+                self._record_failure(path, 'llm', e)
+
+    def _writer(self, store_queue):
+        # Pages and tokens per path, reported once the document is actually stored
+        pending = {}
+
+        def on_flush(stored, errors):
+            for error in errors:
+                pending.pop(error['filename'], None)
+                self._record_failure(error['filename'], 'store', error['error'])
+            if stored:
+                self._record_done([doc.filename for doc in stored])
+                counts = [pending.pop(doc.filename, (0, 0)) for doc in stored]
+                self.stats.add(docs=len(stored), pages=sum(c[0] for c in counts), tokens=sum(c[1] for c in counts))
+                print(self.stats.summary())
+
+        with BulkDocumentWriter(batch_size=self.batch_size, on_flush=on_flush) as writer:
+            while True:
+                item = store_queue.get()
+                if item is _DONE:
+                    break
+                path, content_hash, pages, tokens, statement = item
+                try:
+                    doc = build_document(path, statement, pdf_path=path, content_hash=content_hash)
+                except Exception as e:
+                    traceback.print_exc()
+                    self._record_failure(path, 'store', e)
+                    continue
+                pending[path] = (pages, tokens)
+                writer.add(doc)
+
+    def run(self, paths):
+        done = load_checkpoint(self.checkpoint_path)
+        todo = [path for path in paths if path not in done]
+        print(f"{len(paths)} PDFs found, {len(paths) - len(todo)} already ingested, {len(todo)} to process")
+
+        pending = queue.Queue()
+        for path in todo:
+            pending.put(path)
+        # Bounded hand-off queues keep OCR from racing far ahead of the LLM stage
+        llm_queue = queue.Queue(maxsize=self.llm_workers * 2)
+        store_queue = queue.Queue(maxsize=self.batch_size * 2)
+
+        ocr_threads = [threading.Thread(target=self._ocr_worker, args=(pending, llm_queue), daemon=True)
+                       for _ in range(self.ocr_workers)]
+        llm_threads = [threading.Thread(target=self._llm_worker, args=(llm_queue, store_queue), daemon=True)
+                       for _ in range(self.llm_workers)]
+        writer_thread = threading.Thread(target=self._writer, args=(store_queue,), daemon=True)
+        for thread in ocr_threads + llm_threads + [writer_thread]:
+            thread.start()
+
+        for thread in ocr_threads:
+            thread.join()
+        for _ in llm_threads:
+            llm_queue.put(_DONE)
+        for thread in llm_threads:
+            thread.join()
+        store_queue.put(_DONE)
+        writer_thread.join()
+
+        print(f"Batch complete: {self.stats.summary()}")
+        if self.stats.failures:
+            print(f"Failed documents written to {self.retry_path}")
+        return self.stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory or glob of statement PDFs")
+    parser.add_argument('source', help="Directory to walk or glob pattern of PDFs")
+    parser.add_argument('--ocr-workers', type=int, default=1, help="Concurrent Docling conversions")
+    parser.add_argument('--llm-workers', type=int, default=4, help="Concurrent LLM extractions")
+    parser.add_argument('--batch-size', type=int, default=50, help="Documents per Mongo bulk write")
+    parser.add_argument('--model', default="openai", choices=["openai", "ollama"])
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="File of already ingested paths")
+    parser.add_argument('--retry-list', default=DEFAULT_RETRY_LIST, help="File that failed documents are appended to")
+    args = parser.parse_args()
+
+    for path in (args.checkpoint, args.retry_list):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    ensure_indexes()
+    ingestor = BatchIngestor(
+        ocr_workers=args.ocr_workers,
+        llm_workers=args.llm_workers,
+        batch_size=args.batch_size,
+        model_name=args.model,
+        checkpoint_path=args.checkpoint,
+        retry_path=args.retry_list,
+    )
+    ingestor.run(find_pdfs(args.source))
+
+if __name__ == "__main__":
+    main()
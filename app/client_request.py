@@ -1,59 +1,479 @@
 from pydantic import BaseModel
 import instructor
-from openai import OpenAI
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
 
-def parse_lead_from_message(pydantic_model: BaseModel, user_message: str, model_name: str = "openai"):
-    
+from .fields_to_extract import CreditCardStatement, StatementHeader, SpendItemList, SpendItem, CategorizedRows
+from .table_parser import parse_transaction_tables
+from .markdown_tables import is_separator_row, split_blocks
+from .merchant_categories import normalize_merchant, lookup_categories, record_categories
+from . import metrics
+
+_log = logging.getLogger(__name__)
+
+# Statements longer than this are extracted in chunks
+CHUNKED_EXTRACTION_MIN_CHARS = int(os.getenv('CHUNKED_EXTRACTION_MIN_CHARS', '24000'))
+CHUNK_MAX_CHARS = int(os.getenv('CHUNK_MAX_CHARS', '12000'))
+# Table rows repeated at the start of the next chunk when a table is split
+CHUNK_OVERLAP_ROWS = int(os.getenv('CHUNK_OVERLAP_ROWS', '2'))
+# Maximum number of chunk requests in flight per statement
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '4'))
+# Read transaction rows straight from the markdown tables, leaving the LLM only
+# the header fields and row categories
+TABLE_PREPARSE = os.getenv('TABLE_PREPARSE', '1').lower() in ('1', 'true', 'yes')
+# Distinct descriptions categorized per request
+CATEGORY_BATCH_SIZE = int(os.getenv('CATEGORY_BATCH_SIZE', '80'))
+
+# Shared client settings - configure through the environment
+OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/v1')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '120'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '20'))
+# Maximum number of LLM requests in flight across the whole process
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', str(LLM_MAX_CONCURRENCY)))
+
+# Errors worth retrying; validation errors are retried by instructor itself
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+SYSTEM_PROMPT = (
+    "You are an intelligent assistant that extracts structured information from "
+    "credit card statements/ invoices based only on the information provided. Your ability "
+    "to extract and summarize this information accurately is essential. Do not use "
+    "outside knowledge. Only rely on the context passed by the user"
+)
+
+MODEL_IDS = {
+    "openai": "gpt-4.1-mini-2025-04-14",
+    "ollama": "llama3",
+}
+
+# One pooled client per backend, shared by every request in the process
+_clients = {}
+_clients_lock = threading.Lock()
+_request_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# Async clients are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+
+# When the raw completion arrived, so the rest of the call can be timed as validation
+_timing = threading.local()
+
+def _http_settings():
+    return {
+        'timeout': httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        'limits': httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+    }
+
+def _on_completion(response):
+    _timing.response_at = time.perf_counter()
+    usage = getattr(response, 'usage', None)
+    metrics.record_tokens(getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None))
+
+def _wrap(openai_client, model_name: str):
     if model_name == "openai":
-        client = instructor.from_openai(OpenAI())
-        return client.chat.completions.create(
-            model="gpt-4.1-mini-2025-04-14",
-            response_model=pydantic_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an intelligent assistant that extracts structured information from "
-                    "credit card statements/ invoices based only on the information provided. Your ability "
-                    "to extract and summarize this information accurately is essential. Do not use "
-                    "outside knowledge. Only rely on the context passed by the user",
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract the user's CreditCardStatement information from this statement: {user_message}",
-                },
-            ],
-        )
-    
-    elif model_name == "ollama":
-        client = instructor.from_openai(
-                        OpenAI(
-                            base_url="http://localhost:11434/v1",
-                            api_key="ollama",  # required, but unused
-                        ),
-                        mode=instructor.Mode.JSON,
-                    )
-        
-        return client.chat.completions.create(
-                    model="llama3",
-                    messages=[
-
-                        {
-                    "role": "system",
-                    "content": "You are an intelligent assistant that extracts structured information from "
-                    "credit card statements/ invoices based only on the information provided. Your ability "
-                    "to extract and summarize this information accurately is essential. Do not use "
-                    "outside knowledge. Only rely on the context passed by the user",
-                        },
-                        
-                        {
-                            "role": "user",
-                            "content": f"Extract the user's CreditCardStatement information from this statement: {user_message}",
-                        }
-                    ],
-                    response_model=pydantic_model,
-                )
-    
+        client = instructor.from_openai(openai_client)
+    else:
+        client = instructor.from_openai(openai_client, mode=instructor.Mode.JSON)
+    if metrics.METRICS_ENABLED and hasattr(client, 'on'):
+        client.on("completion:response", _on_completion)
+    return client
 
+def _client_kwargs(model_name: str):
+    if model_name == "openai":
+        # OPENAI_API_KEY and OPENAI_BASE_URL are read from the environment
+        return {'max_retries': 0}
+    elif model_name == "ollama":
+        return {
+            'base_url': OLLAMA_BASE_URL,
+            'api_key': "ollama",  # required, but unused
+            'max_retries': 0,
+        }
     else:
         raise ValueError(f"Model {model_name} not supported")
-    
\ No newline at end of file
+
+def get_client(model_name: str):
+    """Return the shared instructor client for a backend, creating it on first use"""
+    with _clients_lock:
+        client = _clients.get(model_name)
+        if client is None:
+            kwargs = _client_kwargs(model_name)
+            http_client = httpx.Client(**_http_settings())
+            client = _wrap(OpenAI(http_client=http_client, **kwargs), model_name)
+            _clients[model_name] = client
+        return client
+
+def get_async_client(model_name: str):
+    """Return the shared async instructor client and request cap for the running event loop"""
+    loop = asyncio.get_running_loop()
+    loop_clients = _async_clients.setdefault(loop, {})
+    if model_name not in loop_clients:
+        kwargs = _client_kwargs(model_name)
+        http_client = httpx.AsyncClient(**_http_settings())
+        client = _wrap(AsyncOpenAI(http_client=http_client, **kwargs), model_name)
+        loop_clients[model_name] = (client, asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+    return loop_clients[model_name]
+
+def _backoff_delay(attempt: int):
+    # Full jitter: a random delay up to the exponential cap
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+def _timed_call(fn, *args, **kwargs):
+    """Call the LLM, splitting the time into the request and Pydantic validation"""
+    if not metrics.METRICS_ENABLED:
+        return fn(*args, **kwargs)
+    _timing.response_at = None
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    end = time.perf_counter()
+    response_at = _timing.response_at or end
+    metrics.record('llm_call', response_at - start)
+    metrics.record('validation', end - response_at)
+    return result
+
+def _call_with_retries(fn, *args, **kwargs):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            with _request_slots:
+                return _timed_call(fn, *args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            _log.warning(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+async def _call_with_retries_async(semaphore, fn, *args, **kwargs):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                with metrics.span('llm_call'):
+                    return await fn(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            _log.warning(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+def _messages(instruction: str, user_message: str):
+    with metrics.span('prompt_build'):
+        return _build_messages(instruction, user_message)
+
+def _build_messages(instruction: str, user_message: str):
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": f"{instruction}: {user_message}",
+        },
+    ]
+
+def _create_with_usage(pydantic_model: BaseModel, instruction: str, user_message: str, model_name: str):
+    """Run one extraction request and return the parsed model with its latency and token usage"""
+    client = get_client(model_name)
+    start_time = time.time()
+    result, completion = _call_with_retries(
+        client.chat.completions.create_with_completion,
+        model=MODEL_IDS[model_name],
+        response_model=pydantic_model,
+        messages=_messages(instruction, user_message),
+    )
+    usage = getattr(completion, 'usage', None)
+    stats = {
+        'latency': time.time() - start_time,
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+    }
+    return result, stats
+
+def parse_lead_from_message(pydantic_model: BaseModel, user_message: str, model_name: str = "openai"):
+
+    client = get_client(model_name)
+    return _call_with_retries(
+        client.chat.completions.create,
+        model=MODEL_IDS[model_name],
+        response_model=pydantic_model,
+        messages=_messages("Extract the user's CreditCardStatement information from this statement", user_message),
+    )
+
+async def parse_lead_from_message_async(pydantic_model: BaseModel, user_message: str, model_name: str = "openai"):
+    """Async variant of parse_lead_from_message for batch jobs"""
+    client, semaphore = get_async_client(model_name)
+    return await _call_with_retries_async(
+        semaphore,
+        client.chat.completions.create,
+        model=MODEL_IDS[model_name],
+        response_model=pydantic_model,
+        messages=_messages("Extract the user's CreditCardStatement information from this statement", user_message),
+    )
+
+def split_statement_markdown(markdown: str, max_chars: int = CHUNK_MAX_CHARS, overlap_rows: int = CHUNK_OVERLAP_ROWS):
+    """Split statement markdown into chunks of about max_chars, breaking only between
+    blocks or, for oversized tables, between rows (repeating the table header).
+
+    Returns a list of (chunk_text, overlap) pairs, where overlap is the number of
+    rows repeated from the previous chunk.
+    """
+    chunks = []
+    current, current_len, current_overlap = [], 0, 0
+
+    def flush():
+        nonlocal current, current_len, current_overlap
+        if any(line.strip() for line in current):
+            chunks.append(('\n'.join(current), current_overlap))
+        current, current_len, current_overlap = [], 0, 0
+
+    for is_table, lines in split_blocks(markdown):
+        block_len = sum(len(line) + 1 for line in lines)
+        if current_len + block_len <= max_chars:
+            current.extend(lines)
+            current_len += block_len
+            continue
+
+        if not is_table or block_len <= max_chars:
+            flush()
+            current.extend(lines)
+            current_len += block_len
+            continue
+
+        # Oversized table: split between rows, repeating header and a few border rows
+        header = lines[:2] if len(lines) > 1 and is_separator_row(lines[1]) else lines[:1]
+        rows = lines[len(header):]
+        header_len = sum(len(line) + 1 for line in header)
+        if current_len + header_len > max_chars:
+            flush()
+        current.extend(header)
+        current_len += header_len
+        emitted = []
+        for row in rows:
+            if current_len + len(row) + 1 > max_chars and emitted:
+                flush()
+                carried = emitted[-overlap_rows:] if overlap_rows else []
+                current = header + carried
+                current_len = header_len + sum(len(line) + 1 for line in carried)
+                current_overlap = len(carried)
+                emitted = []
+            current.append(row)
+            current_len += len(row) + 1
+            emitted.append(row)
+    flush()
+    return chunks
+
+def _item_key(item):
+    return (item.spend_date, ' '.join(item.spend_description.lower().split()), item.amount)
+
+def merge_spend_items(chunk_items, overlaps):
+    """Concatenate per-chunk items, dropping rows repeated across chunk borders"""
+    merged = []
+    previous = []
+    for items, overlap in zip(chunk_items, overlaps):
+        items = list(items)
+        if overlap and previous:
+            # Drop at most `overlap` leading duplicates of rows seen in the previous chunk
+            previous_keys = {}
+            for item in previous:
+                key = _item_key(item)
+                previous_keys[key] = previous_keys.get(key, 0) + 1
+            kept, dropped = [], 0
+            for item in items:
+                key = _item_key(item)
+                if dropped < overlap and previous_keys.get(key, 0) > 0:
+                    previous_keys[key] -= 1
+                    dropped += 1
+                    continue
+                kept.append(item)
+            items = kept
+        merged.extend(items)
+        previous = items
+    return merged
+
+def parse_statement_chunked(markdown: str, model_name: str = "openai", max_in_flight: int = LLM_MAX_IN_FLIGHT, report: list = None):
+    """Extract a long statement chunk by chunk.
+
+    Header fields are extracted once from the first chunk, while the spend line items
+    of all chunks are extracted concurrently with at most max_in_flight requests.
+    Latency and token usage per request are logged and appended to `report` if given.
+    """
+    chunks = split_statement_markdown(markdown)
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        header_future = executor.submit(
+            metrics.run_in_context(_create_with_usage), StatementHeader,
+            "Extract the customer name, address and payment information from this statement",
+            chunks[0][0], model_name,
+        )
+        item_futures = [
+            executor.submit(
+                metrics.run_in_context(_create_with_usage), SpendItemList,
+                "Extract every purchase from this part of a credit card statement",
+                chunk_text, model_name,
+            )
+            for chunk_text, _ in chunks
+        ]
+        header, header_stats = header_future.result()
+        item_results = [future.result() for future in item_futures]
+
+    stats = [dict(header_stats, chunk='header')]
+    for index, (result, chunk_stats) in enumerate(item_results):
+        stats.append(dict(chunk_stats, chunk=index, items=len(result.spend_line_items)))
+    for entry in stats:
+        _log.info(f"Chunk {entry['chunk']}: {entry['latency']:.2f}s, "
+                  f"{entry['prompt_tokens']} prompt tokens, {entry['completion_tokens']} completion tokens")
+    if report is not None:
+        report.extend(stats)
+
+    spend_line_items = merge_spend_items(
+        [result.spend_line_items for result, _ in item_results],
+        [overlap for _, overlap in chunks],
+    )
+    with metrics.span('validation'):
+        return CreditCardStatement(
+            customer_name=header.customer_name,
+            customer_address=header.customer_address,
+            payment_info=header.payment_info,
+            spend_line_items=spend_line_items,
+        )
+
+def parse_statement_preparsed(rows: list, remaining_markdown: str, model_name: str = "openai",
+                              max_in_flight: int = LLM_MAX_IN_FLIGHT, report: list = None,
+                              use_merchant_cache: bool = True, declined_tables: list = None):
+    """Extract a statement whose transaction rows were already read from its tables.
+
+    The LLM only extracts the header fields from the rest of the markdown and
+    categorizes merchants missing from the merchant category cache, one
+    description per merchant and CATEGORY_BATCH_SIZE per request. Purchases in
+    `declined_tables` (transaction tables the parser couldn't read) are extracted
+    by the LLM, in chunks, and added to the rows. With use_merchant_cache=False
+    every merchant goes to the LLM and no votes are recorded.
+    """
+    chunks = split_statement_markdown(remaining_markdown)
+    declined_chunks = split_statement_markdown('\n\n'.join(declined_tables)) if declined_tables else []
+    descriptions = list(dict.fromkeys(row['spend_description'] for row in rows))
+    categories = lookup_categories(descriptions) if use_merchant_cache else {}
+    unseen = {}
+    for description in descriptions:
+        if description not in categories:
+            unseen.setdefault(normalize_merchant(description) or description, []).append(description)
+    representatives = [group[0] for group in unseen.values()]
+    batches = [representatives[start:start + CATEGORY_BATCH_SIZE]
+               for start in range(0, len(representatives), CATEGORY_BATCH_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        header_future = executor.submit(
+            metrics.run_in_context(_create_with_usage), StatementHeader,
+            "Extract the customer name, address and payment information from this statement",
+            chunks[0][0] if chunks else remaining_markdown, model_name,
+        )
+        category_futures = [
+            executor.submit(
+                metrics.run_in_context(_create_with_usage), CategorizedRows,
+                "Categorize each of these numbered credit card transactions",
+                '\n'.join(f"{number}. {description}" for number, description in enumerate(batch, start=1)),
+                model_name,
+            )
+            for batch in batches
+        ]
+        item_futures = [
+            executor.submit(
+                metrics.run_in_context(_create_with_usage), SpendItemList,
+                "Extract every purchase from this part of a credit card statement",
+                chunk_text, model_name,
+            )
+            for chunk_text, _ in declined_chunks
+        ]
+        header, header_stats = header_future.result()
+        category_results = [future.result() for future in category_futures]
+        item_results = [future.result() for future in item_futures]
+
+    learned = {}
+    stats = [dict(header_stats, chunk='header')]
+    for index, (batch, (result, batch_stats)) in enumerate(zip(batches, category_results)):
+        for entry in result.categories:
+            if 1 <= entry.id <= len(batch):
+                learned[batch[entry.id - 1]] = entry.category
+        stats.append(dict(batch_stats, chunk=f"categories {index}", items=len(batch)))
+    for group in unseen.values():
+        if group[0] in learned:
+            categories.update(dict.fromkeys(group, learned[group[0]]))
+    for index, (result, chunk_stats) in enumerate(item_results):
+        stats.append(dict(chunk_stats, chunk=f"declined tables {index}", items=len(result.spend_line_items)))
+    extracted_items = merge_spend_items(
+        [result.spend_line_items for result, _ in item_results],
+        [overlap for _, overlap in declined_chunks],
+    )
+    if use_merchant_cache:
+        record_categories(dict(learned, **{item.spend_description: item.category for item in extracted_items}))
+    _log.info(f"Read {len(rows)} rows from the statement tables; {len(descriptions) - sum(map(len, unseen.values()))} "
+              f"descriptions categorized from the merchant cache, {len(representatives)} merchants in {len(batches)} requests")
+    if declined_chunks:
+        _log.info(f"Extracted {len(extracted_items)} rows from {len(declined_tables)} tables the parser declined")
+    for entry in stats:
+        _log.info(f"Chunk {entry['chunk']}: {entry['latency']:.2f}s, "
+                  f"{entry['prompt_tokens']} prompt tokens, {entry['completion_tokens']} completion tokens")
+    if report is not None:
+        report.extend(stats)
+
+    with metrics.span('validation'):
+        return CreditCardStatement(
+            customer_name=header.customer_name,
+            customer_address=header.customer_address,
+            payment_info=header.payment_info,
+            spend_line_items=[
+                SpendItem(**row, category=categories.get(row['spend_description'], 'Other'))
+                for row in rows
+            ] + list(extracted_items),
+        )
+
+def extract_statement(markdown: str, model_name: str = "openai", report: list = None, preparse: bool = None,
+                      use_merchant_cache: bool = True):
+    """Extract a CreditCardStatement.
+
+    Transaction rows are read from the markdown tables when possible (see
+    TABLE_PREPARSE); otherwise the LLM extracts everything, in chunks for long
+    statements. If `report` is given, latency and token usage of every request
+    are appended to it. With use_merchant_cache=False the merchant category
+    cache is neither read nor updated.
+    """
+    if preparse is None:
+        preparse = TABLE_PREPARSE
+    if preparse:
+        with metrics.span('table_parse'):
+            rows, remaining_markdown, declined_tables = parse_transaction_tables(markdown)
+        if rows:
+            # Tables the parser declined go to the LLM, so their purchases aren't lost
+            return parse_statement_preparsed(rows, remaining_markdown, model_name=model_name, report=report,
+                                             use_merchant_cache=use_merchant_cache, declined_tables=declined_tables)
+    if len(markdown) > CHUNKED_EXTRACTION_MIN_CHARS:
+        result = parse_statement_chunked(markdown, model_name=model_name, report=report)
+    elif report is None:
+        result = parse_lead_from_message(CreditCardStatement, markdown, model_name=model_name)
+    else:
+        result, stats = _create_with_usage(
+            CreditCardStatement,
+            "Extract the user's CreditCardStatement information from this statement",
+            markdown, model_name,
+        )
+        report.append(dict(stats, chunk='full'))
+    # Categories from full extractions warm the merchant cache too
+    if use_merchant_cache:
+        record_categories({item.spend_description: item.category for item in result.spend_line_items})
+    return result
@@ -1,49 +1,158 @@
-from sqlalchemy import create_engine, Column, String, DateTime, JSON, Float, Date
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, date
 import os
 import json
+import io
+import shutil
+import threading
+import time
 from .fields_to_extract import CreditCardStatement
-from pymongo import MongoClient
-from bson import ObjectId, Binary
+from .extraction_cache import file_sha256
+from .line_items import LineItemColumns
+from .results_cache import cached_result, invalidate_customers, clear_results, ALL_CUSTOMERS
+from . import metrics
+from pymongo import MongoClient, InsertOne, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from gridfs import GridFSBucket
+from bson import ObjectId, Binary, Decimal128
+from bson.errors import InvalidId
 from decimal import Decimal
 import base64
+import logging
+
+_log = logging.getLogger(__name__)
 
 # MongoDB connection string - you'll need to set this in your environment
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+MONGODB_DB = os.getenv('MONGODB_DB', 'document_classifier')
+
+# PDFs are kept in GridFS; document records only hold a reference and the hash
+PDF_BUCKET_NAME = 'pdfs'
+PDF_CHUNK_SIZE = int(os.getenv('PDF_CHUNK_SIZE', str(255 * 1024)))
+
+# The MongoDB client is created on first use, so importing this module stays cheap
+_client = None
+_pdf_bucket = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared MongoClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGODB_URI)
+    return _client
+
+def get_db():
+    return get_client()[MONGODB_DB]
+
+def get_documents_collection():
+    return get_db().documents
+
+def get_rollups_collection():
+    # Per-customer spending totals, kept up to date as statements are stored
+    return get_db().customer_rollups
+
+def get_merchant_categories_collection():
+    # Category votes per normalized merchant, see merchant_categories
+    return get_db().merchant_categories
+
+def get_pdf_files_collection():
+    return get_db()[f'{PDF_BUCKET_NAME}.files']
+
+def get_pdf_bucket():
+    global _pdf_bucket
+    if _pdf_bucket is None:
+        db = get_db()
+        with _client_lock:
+            if _pdf_bucket is None:
+                _pdf_bucket = GridFSBucket(db, bucket_name=PDF_BUCKET_NAME, chunk_size_bytes=PDF_CHUNK_SIZE)
+    return _pdf_bucket
+
+# The handles that used to be module attributes, for existing callers
+_LAZY_ATTRIBUTES = {
+    'client': get_client,
+    'db': get_db,
+    'documents_collection': get_documents_collection,
+    'rollups_collection': get_rollups_collection,
+    'pdf_files_collection': get_pdf_files_collection,
+    'pdf_bucket': get_pdf_bucket,
+}
+
+def __getattr__(name):
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
+
+# Fields needed to rebuild a Document - excludes the legacy embedded PDF blob
+DOCUMENT_PROJECTION = {
+    'filename': 1,
+    'customer_name': 1,
+    'customer_address': 1,
+    'payment_info': 1,
+    'spend_line_items': 1,
+    'content_hash': 1,
+    'pdf_file_id': 1,
+    'created_at': 1,
+    'updated_at': 1,
+}
 
-# Create MongoDB client and get database
-client = MongoClient(MONGODB_URI)
-db = client['document_classifier']  # Explicitly specify the database name
-documents_collection = db.documents
+# Indexes backing the query functions below and in query_examples, with their options
+DOCUMENT_INDEXES = [
+    ('customer_name_1', [('customer_name', ASCENDING)], {}),
+    ('filename_1', [('filename', ASCENDING)], {}),
+    ('created_at_-1', [('created_at', DESCENDING)], {}),
+    # One record per PDF; records stored without a hash are left out of the index
+    ('content_hash_1', [('content_hash', ASCENDING)],
+     {'unique': True, 'partialFilterExpression': {'content_hash': {'$exists': True}}}),
+    ('spend_line_items.category_1', [('spend_line_items.category', ASCENDING)], {}),
+    ('spend_line_items.spend_date_1', [('spend_line_items.spend_date', ASCENDING)], {}),
+]
+
+# Bulk write settings - configure through the environment
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '100'))
+# Line items fetched per cursor round trip when streaming them for export
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+BULK_FLUSH_INTERVAL = float(os.getenv('BULK_FLUSH_INTERVAL', '5'))
+MILLISECONDS_PER_DAY = 24 * 60 * 60 * 1000
 
 class Document:
-    def __init__(self, filename, customer_name, customer_address, payment_info, spend_line_items, pdf_content=None):
+    # Slots keep per-instance memory down when loading a customer's full history
+    __slots__ = ('filename', 'customer_name', 'customer_address', 'payment_info', 'spend_line_items',
+                 'pdf_content', 'content_hash', 'pdf_file_id', 'id', 'created_at', 'updated_at')
+
+    def __init__(self, filename, customer_name, customer_address, payment_info, spend_line_items, pdf_content=None, content_hash=None, pdf_file_id=None):
         self.filename = filename
         self.customer_name = customer_name
         self.customer_address = customer_address
         self.payment_info = payment_info
         self.spend_line_items = spend_line_items
         self.pdf_content = pdf_content
+        self.content_hash = content_hash
+        self.pdf_file_id = pdf_file_id
+        self.id = ObjectId()
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
 
     @classmethod
     def from_mongo(cls, data):
         """Create a Document instance from MongoDB data"""
-        # Create a copy of the data to avoid modifying the original
-        doc_data = data.copy()
-        
-        # Remove MongoDB's _id field and timestamp fields
-        doc_data.pop('_id', None)
-        doc_data.pop('created_at', None)
-        doc_data.pop('updated_at', None)
-        
-        # Create new instance
-        doc = cls(**doc_data)
+        # Read the fields directly instead of copying the raw dict
+        doc = cls(
+            data.get('filename'),
+            data.get('customer_name'),
+            data.get('customer_address'),
+            data.get('payment_info'),
+            data.get('spend_line_items', []),
+            pdf_content=data.get('pdf_content'),
+            content_hash=data.get('content_hash'),
+            pdf_file_id=data.get('pdf_file_id'),
+        )
         
-        # Set timestamp fields if they exist in the original data
+        # Keep the MongoDB id and timestamp fields if they exist in the original data
+        if '_id' in data:
+            doc.id = data['_id']
         if 'created_at' in data:
             doc.created_at = data['created_at']
         if 'updated_at' in data:
@@ -63,17 +172,22 @@ class Document:
             'updated_at': self.updated_at
         }
         
-        # Add PDF content if it exists
-        if self.pdf_content:
+        # Reference the PDF stored in GridFS; only records that predate the
+        # GridFS migration still embed the content
+        if self.pdf_file_id:
+            doc_dict['pdf_file_id'] = self.pdf_file_id
+        elif self.pdf_content:
             doc_dict['pdf_content'] = Binary(self.pdf_content)
+        if self.content_hash:
+            doc_dict['content_hash'] = self.content_hash
             
         return doc_dict
 
     def _convert_payment_info(self, payment_info):
         """Convert payment info Decimal and date values to MongoDB-compatible formats"""
         return {
-            'new_balance': str(payment_info['new_balance']),
-            'minimum_payment': str(payment_info['minimum_payment']),
+            'new_balance': _to_decimal128(payment_info['new_balance']),
+            'minimum_payment': _to_decimal128(payment_info['minimum_payment']),
             'due_date': datetime.combine(payment_info['due_date'], datetime.min.time())
         }
 
@@ -84,96 +198,658 @@ class Document:
             converted_item = {
                 'spend_date': datetime.combine(item['spend_date'], datetime.min.time()),
                 'spend_description': item['spend_description'],
-                'amount': str(item['amount']),
+                'amount': _to_decimal128(item['amount']),
                 'category': item['category']
             }
             converted_items.append(converted_item)
         return converted_items
 
-def store_document(filename: str, statement_data: CreditCardStatement, pdf_path: str = None):
+def _to_decimal128(value):
+    """Store amounts as Decimal128 so MongoDB compares and sums them as numbers"""
+    if isinstance(value, Decimal128):
+        return value
+    return Decimal128(Decimal(str(value)))
+
+def store_pdf(source, filename: str, content_hash: str):
+    """Stream a PDF into GridFS, reusing the stored copy if one with the same hash exists.
+
+    `source` is a path or a readable binary file object. Returns the GridFS file id.
+    """
+    existing = get_pdf_files_collection().find_one({'metadata.content_hash': content_hash}, {'_id': 1})
+    if existing:
+        return existing['_id']
+    metadata = {'content_hash': content_hash, 'content_type': 'application/pdf'}
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return get_pdf_bucket().upload_from_stream(filename, f, metadata=metadata)
+    return get_pdf_bucket().upload_from_stream(filename, source, metadata=metadata)
+
+def build_document(filename: str, statement_data: CreditCardStatement, pdf_path: str = None, content_hash: str = None):
+    """Build a Document record from a processed statement, storing the PDF in GridFS if a path is given.
+
+    Pass `content_hash` when the PDF's SHA-256 is already known to avoid hashing it again.
+    """
+    # Convert Pydantic model to dict
+    data = statement_data.model_dump()
+    
+    # Stream the PDF into GridFS if path is provided
+    pdf_file_id = None
+    if pdf_path and os.path.exists(pdf_path):
+        content_hash = content_hash or file_sha256(pdf_path)
+        pdf_file_id = store_pdf(pdf_path, os.path.basename(filename), content_hash)
+    
+    # Create document record
+    return Document(
+        filename=filename,
+        customer_name=data['customer_name'],
+        customer_address=data['customer_address'],
+        payment_info=data['payment_info'],
+        spend_line_items=data['spend_line_items'],
+        content_hash=content_hash,
+        pdf_file_id=pdf_file_id
+    )
+
+def _write_op(doc):
+    """Build the write for a document: an upsert keyed by content hash when available."""
+    doc_dict = doc.to_dict()
+    if not doc.content_hash:
+        return InsertOne(dict(doc_dict, _id=doc.id))
+    created_at = doc_dict.pop('created_at')
+    return UpdateOne(
+        {'content_hash': doc.content_hash},
+        {'$set': doc_dict, '$setOnInsert': {'_id': doc.id, 'created_at': created_at}},
+        upsert=True
+    )
+
+def escape_field_name(name: str):
+    """Escape a name (such as a category) for use as a field name ('.' and '$' are not allowed)"""
+    return name.replace('.', '\uff0e').replace('$', '\uff04')
+
+def unescape_field_name(field: str):
+    return field.replace('\uff0e', '.').replace('\uff04', '$')
+
+def _as_decimal(value):
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+def _rollup_increments(spend_line_items, sign=1):
+    """$inc fields that add (or, with sign=-1, remove) line items from a customer rollup"""
+    increments = {}
+
+    def add(field, amount):
+        increments[field] = increments.get(field, Decimal(0)) + amount
+
+    for item in spend_line_items:
+        amount = _as_decimal(item['amount']) * sign
+        add('total', amount)
+        add(f"categories.{escape_field_name(item['category'])}", amount)
+        add(f"months.{item['spend_date'].strftime('%Y-%m')}", amount)
+    increments = {field: Decimal128(amount) for field, amount in increments.items()}
+    increments['item_count'] = len(spend_line_items) * sign
+    return increments
+
+def _rollup_op(customer_name, spend_line_items, sign=1, document_count=1):
+    increments = _rollup_increments(spend_line_items, sign)
+    increments['document_count'] = document_count * sign
+    return UpdateOne(
+        {'_id': customer_name},
+        {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def _backfill_new_rollups(result):
+    """Rebuild the rollups an $inc upsert just created for customers with documents stored before rollups existed.
+
+    Without this, such a rollup would only hold the statements written since.
+    """
+    for customer_name in result.upserted_ids.values():
+        rollup = get_rollups_collection().find_one({'_id': customer_name}, {'document_count': 1})
+        stored = get_documents_collection().count_documents({'customer_name': customer_name})
+        if rollup is None or stored > rollup.get('document_count', 0):
+            rebuild_customer_rollups(customer_name)
+
+def _insert_document(doc, doc_dict, rollup_ops):
+    """Write a document record, queueing rollup corrections if it replaced an older version.
+
+    Returns the customer of the replaced version, or None.
+    """
+    if doc.content_hash:
+        created_at = doc_dict.pop('created_at')
+
+        def upsert():
+            return get_documents_collection().find_one_and_update(
+                {'content_hash': doc.content_hash},
+                {'$set': doc_dict, '$setOnInsert': {'_id': doc.id, 'created_at': created_at}},
+                projection={'customer_name': 1, 'spend_line_items': 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+
+        try:
+            previous = upsert()
+        except DuplicateKeyError:
+            # Another writer inserted the same PDF first; the retry updates its record
+            previous = upsert()
+        if previous:
+            # The existing record keeps its id; replace the previous
+            # version's contribution to the rollup
+            doc.id = previous['_id']
+            rollup_ops.append(_rollup_op(previous['customer_name'], previous['spend_line_items'], sign=-1))
+            return previous['customer_name']
+    else:
+        get_documents_collection().insert_one(dict(doc_dict, _id=doc.id))
+    return None
+
+def store_document(filename: str, statement_data: CreditCardStatement, pdf_path: str = None, content_hash: str = None):
     """Store a processed credit card statement in the database."""
     try:
-        # Convert Pydantic model to dict
-        data = statement_data.model_dump()
+        doc = build_document(filename, statement_data, pdf_path, content_hash=content_hash)
+        doc_dict = doc.to_dict()
+        rollup_ops = [_rollup_op(doc.customer_name, doc.spend_line_items)]
         
-        # Read PDF content if path is provided
-        pdf_content = None
-        if pdf_path and os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as f:
-                pdf_content = f.read()
+        # Insert into MongoDB (re-uploading the same PDF updates the existing record)
+        with metrics.span('mongo_insert'):
+            previous_customer = _insert_document(doc, doc_dict, rollup_ops)
         
-        # Create document record
-        doc = Document(
-            filename=filename,
-            customer_name=data['customer_name'],
-            customer_address=data['customer_address'],
-            payment_info=data['payment_info'],
-            spend_line_items=data['spend_line_items'],
-            pdf_content=pdf_content
-        )
-        
-        # Insert into MongoDB
-        result = documents_collection.insert_one(doc.to_dict())
+        with metrics.span('rollup_update'):
+            result = get_rollups_collection().bulk_write(rollup_ops, ordered=True)
+            _backfill_new_rollups(result)
+        # A replaced version may have belonged to another customer
+        invalidate_customers([doc.customer_name] + ([previous_customer] if previous_customer else []))
         return doc
     except Exception as e:
         raise
 
+class BulkDocumentWriter:
+    """Buffers documents and writes them with unordered bulk writes.
+
+    The buffer is flushed when it reaches batch_size documents, every flush_interval
+    seconds, and on close(). Documents with a content hash are upserted, so
+    re-ingesting the same PDF is idempotent. Per-document failures are collected in
+    `errors` instead of aborting the rest of the batch.
+    """
+
+    def __init__(self, batch_size=BULK_BATCH_SIZE, flush_interval=BULK_FLUSH_INTERVAL, on_flush=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.errors = []
+        self.written = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def add(self, doc):
+        with self._lock:
+            self._buffer.append(doc)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered documents; returns (stored docs, errors) for this flush."""
+        with self._lock:
+            docs, self._buffer = self._buffer, []
+        if not docs:
+            return [], []
+
+        failed = {}
+        upserted = set()
+        duplicates = []
+        try:
+            with metrics.span('mongo_bulk_write'):
+                result = get_documents_collection().bulk_write([_write_op(doc) for doc in docs], ordered=False)
+            upserted = set(result.upserted_ids)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed[write_error['index']] = write_error.get('errmsg', str(write_error))
+                if write_error.get('code') == 11000 and docs[write_error['index']].content_hash:
+                    duplicates.append(write_error['index'])
+            upserted = set(entry['index'] for entry in e.details.get('upserted', []))
+        except Exception as e:
+            failed = {index: str(e) for index in range(len(docs))}
+
+        if duplicates:
+            # Upserts that raced another writer for the same PDF; retried, they update
+            # the record it created (so, like re-ingested PDFs, they don't add to the rollups)
+            try:
+                get_documents_collection().bulk_write([_write_op(docs[index]) for index in duplicates], ordered=False)
+                retried = duplicates
+            except BulkWriteError as e:
+                still_failed = {duplicates[write_error['index']] for write_error in e.details.get('writeErrors', [])}
+                retried = [index for index in duplicates if index not in still_failed]
+            except Exception:
+                retried = []
+            for index in retried:
+                del failed[index]
+
+        # Only newly created records add to the rollups; re-ingested PDFs are
+        # already counted (rebuild_customer_rollups repairs any drift)
+        new_docs = [doc for index, doc in enumerate(docs)
+                    if index not in failed and (index in upserted or not doc.content_hash)]
+        if new_docs:
+            try:
+                result = get_rollups_collection().bulk_write(
+                    [_rollup_op(doc.customer_name, doc.spend_line_items) for doc in new_docs],
+                    ordered=False
+                )
+                _backfill_new_rollups(result)
+            except Exception as e:
+                # The documents are stored; rebuild_customer_rollups repairs the rollups
+                _log.error(f"Rollup update failed for {len(new_docs)} documents, "
+                           f"run the 'rollups' migration to repair them: {e}")
+
+        errors = [{'filename': docs[index].filename, 'content_hash': docs[index].content_hash, 'error': message}
+                  for index, message in sorted(failed.items())]
+        stored = [doc for index, doc in enumerate(docs) if index not in failed]
+        if stored:
+            invalidate_customers(doc.customer_name for doc in stored)
+        with self._lock:
+            self.errors.extend(errors)
+            self.written += len(stored)
+        if self.on_flush:
+            self.on_flush(stored, errors)
+        return stored, errors
+
+    def close(self):
+        self._closed.set()
+        if self._timer:
+            self._timer.join()
+        self.flush()
+
+def store_documents(docs, batch_size=BULK_BATCH_SIZE):
+    """Store several Document records with unordered bulk writes.
+
+    Returns a list of per-document errors; documents not listed were stored.
+    """
+    with BulkDocumentWriter(batch_size=batch_size, flush_interval=None) as writer:
+        for doc in docs:
+            writer.add(doc)
+    return writer.errors
+
 def get_documents_by_customer(customer_name: str):
     """Retrieve all documents for a specific customer."""
     try:
-        cursor = documents_collection.find({'customer_name': customer_name})
+        cursor = get_documents_collection().find({'customer_name': customer_name}, DOCUMENT_PROJECTION)
         return [Document.from_mongo(doc) for doc in cursor]
     except Exception as e:
         raise
 
+def _object_id(document_id):
+    try:
+        return ObjectId(document_id)
+    except (InvalidId, TypeError):
+        return None
+
+def get_document_version(document_id):
+    """Return when a document was last updated, or None if it doesn't exist."""
+    try:
+        object_id = _object_id(document_id)
+        if object_id is None:
+            return None
+        doc = get_documents_collection().find_one({'_id': object_id}, {'_id': 0, 'updated_at': 1})
+        return doc['updated_at'] if doc else None
+    except Exception as e:
+        raise
+
+def get_document_line_items(document_id):
+    """Return a document's line items with plain dates and float amounts, or None if it doesn't exist."""
+    try:
+        object_id = _object_id(document_id)
+        if object_id is None:
+            return None
+        # Convert on the server so the client receives chart-ready values
+        pipeline = [
+            {'$match': {'_id': object_id}},
+            {'$project': {
+                '_id': 0,
+                'spend_line_items': {'$map': {
+                    'input': '$spend_line_items',
+                    'as': 'item',
+                    'in': {
+                        'spend_date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$$item.spend_date'}},
+                        'spend_description': '$$item.spend_description',
+                        'amount': {'$toDouble': '$$item.amount'},
+                        'category': '$$item.category'
+                    }
+                }}
+            }}
+        ]
+        docs = list(get_documents_collection().aggregate(pipeline))
+        return docs[0]['spend_line_items'] if docs else None
+    except Exception as e:
+        raise
+
+def _line_item_pipeline(customer_names=None, categories=None, start_date: date = None, end_date: date = None):
+    """Aggregation stages that unwind the line items matching the filters, one per output document"""
+    item_filter = {}
+    if categories:
+        item_filter['category'] = {'$in': list(categories)}
+    date_range = {}
+    if start_date:
+        date_range['$gte'] = datetime.combine(start_date, datetime.min.time())
+    if end_date:
+        date_range['$lte'] = datetime.combine(end_date, datetime.min.time())
+    if date_range:
+        item_filter['spend_date'] = date_range
+
+    # Select documents through the indexes first, then the items inside them
+    match = {}
+    if customer_names:
+        match['customer_name'] = {'$in': list(customer_names)}
+    if item_filter:
+        match['spend_line_items'] = {'$elemMatch': item_filter}
+    pipeline = [
+        {'$match': match},
+        {'$project': {'customer_name': 1, 'filename': 1, 'spend_line_items': 1}},
+        {'$unwind': '$spend_line_items'},
+    ]
+    if item_filter:
+        pipeline.append({'$match': {f'spend_line_items.{field}': condition for field, condition in item_filter.items()}})
+    return pipeline
+
+def iter_line_items(customer_names=None, categories=None, start_date: date = None, end_date: date = None,
+                    batch_size: int = EXPORT_BATCH_SIZE):
+    """Stream spend line items matching the filters as flat rows, one at a time.
+
+    Each row has customer_name, filename, document_id, spend_date, spend_description,
+    amount (Decimal) and category. The cursor fetches batch_size rows per round trip,
+    so memory stays flat however many rows match. Dates are inclusive.
+    """
+    pipeline = _line_item_pipeline(customer_names, categories, start_date, end_date)
+    pipeline.append({'$project': {
+        'customer_name': 1,
+        'filename': 1,
+        'spend_date': '$spend_line_items.spend_date',
+        'spend_description': '$spend_line_items.spend_description',
+        'amount': '$spend_line_items.amount',
+        'category': '$spend_line_items.category',
+    }})
+
+    cursor = get_documents_collection().aggregate(pipeline, batchSize=batch_size)
+    try:
+        for row in cursor:
+            spend_date = row.get('spend_date')
+            yield {
+                'customer_name': row.get('customer_name'),
+                'filename': row.get('filename'),
+                'document_id': str(row['_id']),
+                'spend_date': spend_date.date() if isinstance(spend_date, datetime) else spend_date,
+                'spend_description': row.get('spend_description'),
+                'amount': _as_decimal(row['amount']) if row.get('amount') is not None else None,
+                'category': row.get('category'),
+            }
+    finally:
+        cursor.close()
+
+def load_line_item_columns(customer_names=None, categories=None, start_date: date = None, end_date: date = None,
+                           batch_size: int = EXPORT_BATCH_SIZE):
+    """Load the line items matching the filters into a LineItemColumns.
+
+    Dates and amounts are converted to days and cents on the server, so rows are
+    appended to the arrays without creating datetime or Decimal objects.
+    """
+    pipeline = _line_item_pipeline(customer_names, categories, start_date, end_date)
+    pipeline.append({'$project': {
+        '_id': 0,
+        'customer_name': 1,
+        'day': {'$toInt': {'$floor': {'$divide': [{'$toLong': '$spend_line_items.spend_date'}, MILLISECONDS_PER_DAY]}}},
+        'cents': {'$toLong': {'$round': [{'$multiply': [{'$toDecimal': '$spend_line_items.amount'}, 100]}, 0]}},
+        'category': '$spend_line_items.category',
+        'spend_description': '$spend_line_items.spend_description',
+    }})
+    cursor = get_documents_collection().aggregate(pipeline, batchSize=batch_size)
+    try:
+        return LineItemColumns.from_rows(cursor)
+    finally:
+        cursor.close()
+
 def get_all_customers():
     """Retrieve list of all unique customers."""
     try:
-        customers = documents_collection.distinct('customer_name')
-        return list(customers)
+        return cached_result(ALL_CUSTOMERS, None, lambda: list(get_documents_collection().distinct('customer_name')))
     except Exception as e:
         raise
 
+def _aggregate_spending_summary(customer_name: str):
+    """Compute a customer's summary from their stored documents."""
+    # Sum per category on the server; $toDecimal also covers records
+    # that still store amounts as strings
+    pipeline = [
+        {'$match': {'customer_name': customer_name}},
+        {'$project': {'_id': 0, 'spend_line_items.amount': 1, 'spend_line_items.category': 1}},
+        {'$unwind': '$spend_line_items'},
+        {'$group': {
+            '_id': '$spend_line_items.category',
+            'total': {'$sum': {'$toDecimal': '$spend_line_items.amount'}}
+        }}
+    ]
+    category_spend = {}
+    for row in get_documents_collection().aggregate(pipeline):
+        category_spend[row['_id']] = float(row['total'].to_decimal())
+    
+    return {
+        'customer_name': customer_name,
+        'total_spend': sum(category_spend.values()),
+        'category_breakdown': category_spend
+    }
+
 def get_customer_spending_summary(customer_name: str):
     """Get a summary of spending for a specific customer."""
+    return cached_result('spending_summary', customer_name, lambda: _spending_summary(customer_name))
+
+def _spending_summary(customer_name: str):
     try:
-        documents = documents_collection.find({'customer_name': customer_name})
-        total_spend = 0
-        category_spend = {}
-        
-        for doc in documents:
-            for item in doc['spend_line_items']:
-                amount = float(item['amount'])  # Convert string back to float
-                category = item['category']
-                total_spend += amount
-                category_spend[category] = category_spend.get(category, 0) + amount
+        rollup = get_rollups_collection().find_one({'_id': customer_name}, {'total': 1, 'categories': 1})
+        if rollup is None:
+            # Customer stored before rollups existed
+            return _aggregate_spending_summary(customer_name)
         
         return {
             'customer_name': customer_name,
-            'total_spend': total_spend,
-            'category_breakdown': category_spend
+            'total_spend': float(_as_decimal(rollup['total'])),
+            'category_breakdown': {
+                unescape_field_name(field): float(_as_decimal(amount))
+                for field, amount in rollup.get('categories', {}).items()
+            }
         }
     except Exception as e:
         raise
 
+def get_customer_monthly_spending(customer_name: str):
+    """Get a customer's total spend per month (YYYY-MM), from their rollup when they have one."""
+    return cached_result('monthly_spending', customer_name, lambda: _monthly_spending(customer_name))
+
+def _aggregate_monthly_spending(customer_name: str):
+    """Compute a customer's spend per month from their stored documents."""
+    pipeline = [
+        {'$match': {'customer_name': customer_name}},
+        {'$project': {'_id': 0, 'spend_line_items.amount': 1, 'spend_line_items.spend_date': 1}},
+        {'$unwind': '$spend_line_items'},
+        {'$group': {
+            '_id': {'$dateToString': {'format': '%Y-%m', 'date': '$spend_line_items.spend_date'}},
+            'total': {'$sum': {'$toDecimal': '$spend_line_items.amount'}}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+    return {row['_id']: float(row['total'].to_decimal()) for row in get_documents_collection().aggregate(pipeline)}
+
+def _monthly_spending(customer_name: str):
+    try:
+        rollup = get_rollups_collection().find_one({'_id': customer_name}, {'months': 1})
+        if rollup is None:
+            # Customer stored before rollups existed
+            return _aggregate_monthly_spending(customer_name)
+        return {month: float(_as_decimal(amount)) for month, amount in sorted(rollup.get('months', {}).items())}
+    except Exception as e:
+        raise
+
+def rebuild_customer_rollups(customer_name: str = None):
+    """Recompute rollups from the stored documents, for one customer or all of them."""
+    match = {'customer_name': customer_name} if customer_name else {}
+    document_counts = {
+        row['_id']: row['count']
+        for row in get_documents_collection().aggregate([
+            {'$match': match},
+            {'$group': {'_id': '$customer_name', 'count': {'$sum': 1}}}
+        ])
+    }
+    pipeline = [
+        {'$match': match},
+        {'$project': {'_id': 0, 'customer_name': 1, 'spend_line_items': 1}},
+        {'$unwind': '$spend_line_items'},
+        {'$group': {
+            '_id': {
+                'customer_name': '$customer_name',
+                'category': '$spend_line_items.category',
+                'month': {'$dateToString': {'format': '%Y-%m', 'date': '$spend_line_items.spend_date'}}
+            },
+            'total': {'$sum': {'$toDecimal': '$spend_line_items.amount'}},
+            'count': {'$sum': 1}
+        }}
+    ]
+    rollups = {
+        name: {'total': Decimal(0), 'categories': {}, 'months': {}, 'item_count': 0, 'document_count': count}
+        for name, count in document_counts.items()
+    }
+    for row in get_documents_collection().aggregate(pipeline, allowDiskUse=True):
+        key = row['_id']
+        rollup = rollups[key['customer_name']]
+        amount = row['total'].to_decimal()
+        category = escape_field_name(key['category'])
+        rollup['total'] += amount
+        rollup['categories'][category] = rollup['categories'].get(category, Decimal(0)) + amount
+        rollup['months'][key['month']] = rollup['months'].get(key['month'], Decimal(0)) + amount
+        rollup['item_count'] += row['count']
+
+    if customer_name:
+        get_rollups_collection().delete_one({'_id': customer_name})
+    else:
+        get_rollups_collection().delete_many({})
+    for name, rollup in rollups.items():
+        get_rollups_collection().replace_one({'_id': name}, {
+            'total': Decimal128(rollup['total']),
+            'categories': {field: Decimal128(amount) for field, amount in rollup['categories'].items()},
+            'months': {month: Decimal128(amount) for month, amount in rollup['months'].items()},
+            'item_count': rollup['item_count'],
+            'document_count': rollup['document_count'],
+            'updated_at': datetime.utcnow()
+        }, upsert=True)
+    if customer_name:
+        invalidate_customers([customer_name])
+    else:
+        clear_results()
+    return len(rollups)
+
 def get_document_pdf(filename: str):
-    """Retrieve the PDF content for a specific document."""
+    """Open the PDF for a specific document as a readable binary stream.
+
+    The returned stream reads from GridFS chunk by chunk; callers should close it.
+    """
     try:
-        doc = documents_collection.find_one({'filename': filename})
-        if doc and 'pdf_content' in doc:
-            return doc['pdf_content']
+        doc = get_documents_collection().find_one(
+            {'filename': filename},
+            {'_id': 0, 'pdf_file_id': 1, 'pdf_content': 1}
+        )
+        if not doc:
+            return None
+        if doc.get('pdf_file_id'):
+            return get_pdf_bucket().open_download_stream(doc['pdf_file_id'])
+        if 'pdf_content' in doc:
+            # Record not yet migrated to GridFS
+            return io.BytesIO(doc['pdf_content'])
         return None
     except Exception as e:
         raise
 
-def save_document_pdf(filename: str, output_path: str):
-    """Retrieve and save a document's PDF to a file."""
+def save_document_pdf(filename: str, output_path: str, chunk_size: int = PDF_CHUNK_SIZE):
+    """Retrieve and save a document's PDF to a file, streaming it in chunks."""
     try:
-        pdf_content = get_document_pdf(filename)
-        if pdf_content:
-            with open(output_path, 'wb') as f:
-                f.write(pdf_content)
+        pdf_stream = get_document_pdf(filename)
+        if pdf_stream:
+            with pdf_stream, open(output_path, 'wb') as f:
+                shutil.copyfileobj(pdf_stream, f, chunk_size)
             return True
         return False
     except Exception as e:
-        raise 
\ No newline at end of file
+        raise
+
+def ensure_indexes():
+    """Create the document indexes if missing and verify they all exist.
+
+    An index created earlier with other options (such as the non-unique content_hash_1) is replaced.
+    """
+    collection = get_documents_collection()
+    existing = collection.index_information()
+    for name, keys, options in DOCUMENT_INDEXES:
+        current = existing.get(name)
+        if current and any(current.get(option) != value for option, value in options.items()):
+            collection.drop_index(name)
+        try:
+            collection.create_index(keys, name=name, **options)
+        except DuplicateKeyError as e:
+            raise RuntimeError(f"Cannot create unique index {name}; remove the duplicate documents first: {e}")
+    get_pdf_files_collection().create_index([('metadata.content_hash', ASCENDING)], name='metadata.content_hash_1')
+
+    existing = collection.index_information()
+    missing = [name for name, _, _ in DOCUMENT_INDEXES if name not in existing]
+    if missing:
+        raise RuntimeError(f"Missing indexes on documents collection: {missing}")
+    return list(existing)
+
+def _uses_collscan(plan):
+    """Return True if any stage of an explain() plan is a full collection scan."""
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_uses_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_uses_collscan(value) for value in plan)
+    return False
+
+def check_query_plans():
+    """Explain every document query and raise if any of them falls back to a COLLSCAN."""
+    sample_date = datetime(2023, 1, 1)
+    finds = {
+        'get_documents_by_customer': ({'customer_name': ''}, DOCUMENT_PROJECTION),
+        'get_document_pdf': ({'filename': ''}, {'_id': 0, 'pdf_file_id': 1, 'pdf_content': 1}),
+        'documents_by_created_at': (
+            {'created_at': {'$gte': sample_date, '$lte': sample_date}},
+            {'_id': 0, 'customer_name': 1, 'created_at': 1}
+        ),
+        'documents_by_category': (
+            {'spend_line_items': {'$elemMatch': {'category': ''}}},
+            {'_id': 0, 'customer_name': 1, 'filename': 1}
+        ),
+        'documents_by_spend_date': (
+            {'spend_line_items.spend_date': {'$gte': sample_date, '$lte': sample_date}},
+            {'_id': 0, 'customer_name': 1, 'filename': 1}
+        ),
+    }
+    plans = {name: get_documents_collection().find(query, projection).explain()
+             for name, (query, projection) in finds.items()}
+    plans['get_customer_spending_summary'] = get_db().command(
+        'aggregate', get_documents_collection().name,
+        pipeline=[{'$match': {'customer_name': ''}}, {'$unwind': '$spend_line_items'}],
+        explain=True
+    )
+
+    collscans = [name for name, plan in plans.items() if _uses_collscan(plan)]
+    if collscans:
+        raise RuntimeError(f"Queries falling back to COLLSCAN: {collscans}")
+    return list(plans)
@@ -0,0 +1,141 @@
+"""Streaming export of spend line items as CSV, NDJSON or Parquet.
+
+Usage:
+    python -m app.export --format csv -o transactions.csv
+    python -m app.export --format ndjson --customer "Joseph Paulson" --category Dining --start 2024-01-01 --end 2024-03-31
+    python -m app.export --format parquet -o transactions.parquet
+
+Rows are read from a Mongo cursor and written in chunks, so memory use does not
+grow with the number of rows exported. Parquet output needs pyarrow.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+
+from .document_store import iter_line_items
+from .streams import ChunkSink
+
+EXPORT_COLUMNS = ['customer_name', 'filename', 'document_id', 'spend_date', 'spend_description', 'amount', 'category']
+# Rows per CSV/NDJSON chunk and per Parquet row group
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '5000'))
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def iter_csv(rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield CSV text in chunks of chunk_rows rows, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson(rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield newline-delimited JSON in chunks of chunk_rows rows"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=_json_default))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def iter_parquet(rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield a Parquet file in pieces, one row group of chunk_rows rows at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('customer_name', pa.string()),
+        ('filename', pa.string()),
+        ('document_id', pa.string()),
+        ('spend_date', pa.date32()),
+        ('spend_description', pa.string()),
+        ('amount', pa.decimal128(18, 2)),
+        ('category', pa.string()),
+    ])
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        batch = {column: [] for column in EXPORT_COLUMNS}
+        count = 0
+        for row in rows:
+            for column in EXPORT_COLUMNS:
+                batch[column].append(row[column])
+            count += 1
+            if count % chunk_rows == 0:
+                writer.write_table(pa.table(batch, schema=schema))
+                batch = {column: [] for column in EXPORT_COLUMNS}
+                yield sink.drain()
+        if batch['document_id']:
+            writer.write_table(pa.table(batch, schema=schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+_WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson, 'parquet': iter_parquet}
+
+def iter_export(fmt, customer_names=None, categories=None, start_date=None, end_date=None,
+                chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the matching line items encoded as `fmt`, chunk by chunk (str for text formats, bytes for Parquet)"""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Export format {fmt} not supported")
+    rows = iter_line_items(customer_names, categories, start_date, end_date)
+    return _WRITERS[fmt](rows, chunk_rows)
+
+def export_to_file(path, fmt, **filters):
+    """Write an export to `path`, or to stdout if path is '-'"""
+    binary = fmt == 'parquet'
+    if path == '-':
+        out = sys.stdout.buffer if binary else sys.stdout
+        for chunk in iter_export(fmt, **filters):
+            out.write(chunk)
+        return
+    mode, kwargs = ('wb', {}) if binary else ('w', {'newline': '', 'encoding': 'utf-8'})
+    with open(path, mode, **kwargs) as out:
+        for chunk in iter_export(fmt, **filters):
+            out.write(chunk)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export spend line items as CSV, NDJSON or Parquet")
+    parser.add_argument('--format', default='csv', choices=sorted(EXPORT_FORMATS))
+    parser.add_argument('--customer', action='append', help="Customer to include (repeatable; default all)")
+    parser.add_argument('--category', action='append', help="Category to include (repeatable; default all)")
+    parser.add_argument('--start', type=date.fromisoformat, help="First spend date, YYYY-MM-DD")
+    parser.add_argument('--end', type=date.fromisoformat, help="Last spend date, YYYY-MM-DD")
+    parser.add_argument('-o', '--output', default='-', help="Output file, '-' for stdout")
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and args.output == '-' and sys.stdout.isatty():
+        parser.error("refusing to write Parquet to a terminal; pass -o")
+    export_to_file(args.output, args.format, customer_names=args.customer, categories=args.category,
+                   start_date=args.start, end_date=args.end)
+    if args.output != '-':
+        print(f"Export written to {args.output}")
+
+if __name__ == "__main__":
+    main()
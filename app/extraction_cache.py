@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from .fields_to_extract import SCHEMA_VERSION
+
+# Cache limits - configure through the environment
+EXTRACTION_CACHE_SIZE = int(os.getenv('EXTRACTION_CACHE_SIZE', '256'))
+EXTRACTION_CACHE_TTL = float(os.getenv('EXTRACTION_CACHE_TTL', str(7 * 24 * 3600)))
+
+class LRUCache:
+    """Thread-safe LRU cache with a maximum size and a per-entry age limit."""
+
+    def __init__(self, maxsize=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl is None or time.time() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+# Docling markdown keyed by PDF hash, validated statements keyed by
+# PDF hash + model + schema version
+markdown_cache = LRUCache()
+statement_cache = LRUCache()
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Compute the SHA-256 of a file without loading it whole into memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _statement_key(content_hash, model_name):
+    # Keyed on the model id, so results from a previous model aren't served after an upgrade
+    from .client_request import MODEL_IDS
+
+    return (content_hash, MODEL_IDS[model_name], SCHEMA_VERSION)
+
+def get_markdown(content_hash):
+    return markdown_cache.get(content_hash)
+
+def put_markdown(content_hash, markdown):
+    markdown_cache.put(content_hash, markdown)
+
+def get_statement(content_hash, model_name):
+    return statement_cache.get(_statement_key(content_hash, model_name))
+
+def put_statement(content_hash, model_name, statement):
+    statement_cache.put(_statement_key(content_hash, model_name), statement)
+
+def cached_markdown(pdf_path, content_hash, on_stage=None, ocr_slot=None):
+    """The PDF's Docling markdown, from the cache or converted (then cached).
+
+    on_stage('ocr') is called before converting; ocr_slot, if given, is held while converting.
+    """
+    markdown = get_markdown(content_hash)
+    if markdown is None:
+        # Imported on first use so callers start without loading Docling
+        from .text_extraction import extract_text_from_pdf
+
+        if on_stage:
+            on_stage('ocr')
+        with ocr_slot or nullcontext():
+            markdown = extract_text_from_pdf(pdf_path)
+        put_markdown(content_hash, markdown)
+    return markdown
+
+def cached_statement(pdf_path, content_hash, model_name, markdown=None, on_stage=None,
+                     ocr_slot=None, llm_slot=None, report=None):
+    """The PDF's extracted statement, from the cache or from its markdown and the LLM (then cached).
+
+    Pass `markdown` if it was already read with cached_markdown. on_stage('ocr') and
+    on_stage('llm') are called before each step that isn't served from the cache;
+    ocr_slot and llm_slot, if given, are held while it runs.
+    """
+    statement = get_statement(content_hash, model_name)
+    if statement is not None:
+        return statement
+    if markdown is None:
+        markdown = cached_markdown(pdf_path, content_hash, on_stage, ocr_slot)
+
+    from .client_request import extract_statement
+
+    if on_stage:
+        on_stage('llm')
+    with llm_slot or nullcontext():
+        statement = extract_statement(markdown, model_name=model_name, report=report)
+    put_statement(content_hash, model_name, statement)
+    return statement
+
+def cache_stats():
+    """Hit/miss counters for both extraction stages."""
+    return {
+        'markdown': markdown_cache.stats(),
+        'statement': statement_cache.stats(),
+    }
@@ -4,7 +4,8 @@ from typing import List
 from datetime import date
 import decimal
 
-
+# Bump whenever the extraction schema changes so cached LLM results are not reused
+SCHEMA_VERSION = "1"
 
 # Address Model
 class CustomerAddress(BaseModel):
@@ -60,6 +61,38 @@ class CreditCardStatement(BaseModel):
     )
 
 
+# Partial models for chunked extraction of long statements
+class StatementHeader(BaseModel):
+    customer_name: constr(strip_whitespace=True, min_length=3) = Field(
+        description="Name of the customer, formatted with each word capitalized"
+    )
+    customer_address: CustomerAddress = Field(
+        description="Address associated with the customer"
+    )
+    payment_info: PaymentInfo = Field(
+        description="Summary of the payment information for this statement"
+    )
+
+
+class SpendItemList(BaseModel):
+    spend_line_items: List[SpendItem] = Field(
+        description="Purchases made using the credit card in this part of the statement! Make sure to extract all the Purchases in it"
+    )
+
+
+# Categories for transaction rows read directly from the statement tables
+class RowCategory(BaseModel):
+    id: int = Field(description="Number of the transaction in the list")
+    category: constr(strip_whitespace=True, min_length=2) = Field(
+        description="Category of the transaction like grocery, dining, travel, etc... If you can't find a category, use 'Other'"
+    )
+
+
+class CategorizedRows(BaseModel):
+    categories: List[RowCategory] = Field(
+        description="One category for every numbered transaction in the list"
+    )
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,100 @@
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .main import finalize_statement
+from . import metrics
+from .extraction_cache import file_sha256, cached_statement
+
+# Concurrency limits - configure through the environment
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+OCR_CONCURRENCY = int(os.getenv('OCR_CONCURRENCY', '1'))
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '4'))
+# Seconds a finished or failed job stays available to get_job
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', '3600'))
+
+# Progress reported for each stage of the pipeline
+STAGE_PROGRESS = {
+    'queued': 0,
+    'ocr': 10,
+    'llm': 50,
+    'storing': 90,
+    'done': 100,
+}
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='upload-job')
+_ocr_slots = threading.BoundedSemaphore(OCR_CONCURRENCY)
+_llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        job.update(fields)
+        if 'status' in fields and fields['status'] in STAGE_PROGRESS:
+            job['progress'] = STAGE_PROGRESS[fields['status']]
+        job['updated_at'] = datetime.utcnow()
+
+def _expire_jobs(now):
+    # Called with _jobs_lock held
+    cutoff = now - timedelta(seconds=JOB_RETENTION)
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['status'] in ('done', 'failed') and job['updated_at'] < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def _run_job(job_id, filepath, model_name, content_hash=None):
+    with metrics.job_breakdown(job_id):
+        _process_job(job_id, filepath, model_name, content_hash)
+
+def _process_job(job_id, filepath, model_name, content_hash=None):
+    try:
+        # Repeat uploads of the same PDF skip OCR and the LLM call; Docling and the
+        # LLM clients are only loaded when they are needed
+        content_hash = content_hash or file_sha256(filepath)
+        response = cached_statement(filepath, content_hash, model_name,
+                                    on_stage=lambda stage: _update_job(job_id, status=stage),
+                                    ocr_slot=_ocr_slots, llm_slot=_llm_slots)
+
+        _update_job(job_id, status='storing')
+        csv_filename, spend_line_items, document_id = finalize_statement(filepath, response, content_hash=content_hash)
+        _update_job(job_id, status='done', csv_filename=csv_filename, document_id=document_id,
+                    item_count=len(spend_line_items))
+    except Exception as e:
+        traceback.print_exc()
+        _update_job(job_id, status='failed', error=str(e))
+
+def submit_job(filepath: str, model_name: str = "openai", content_hash: str = None):
+    """Queue a PDF for processing and return its job id right away.
+
+    Pass `content_hash` if the PDF's SHA-256 was computed while it was saved.
+    """
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    with _jobs_lock:
+        _expire_jobs(now)
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'filename': os.path.basename(filepath),
+            'status': 'queued',
+            'progress': 0,
+            'csv_filename': None,
+            'document_id': None,
+            'item_count': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+    _executor.submit(_run_job, job_id, filepath, model_name, content_hash)
+    return job_id
+
+def get_job(job_id: str):
+    """Return a snapshot of a job's status, or None if the id is unknown or expired."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
@@ -0,0 +1,180 @@
+"""Columnar, array-backed container for many spend line items.
+
+Dates are stored as int32 days since 1970-01-01, amounts as int64 cents, and
+customer names, descriptions and categories are dictionary-encoded as int32
+codes into lists of distinct values. A million line items take about 24 MB,
+against close to 400 MB as lists of dicts with datetime and Decimal values.
+Columns are exposed to NumPy without copying. NumPy and pandas are only
+imported by the conversion methods.
+"""
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+
+EPOCH = date(1970, 1, 1)
+# Day stored for line items without a date; NaT once converted to pandas
+MISSING_DAY = -2 ** 31
+
+def to_day(value):
+    """Days since 1970-01-01 of a date or datetime"""
+    if value is None:
+        return MISSING_DAY
+    if hasattr(value, 'date'):
+        value = value.date()
+    return (value - EPOCH).days
+
+def from_day(day):
+    return None if day == MISSING_DAY else EPOCH + timedelta(days=day)
+
+class _Dictionary:
+    """Distinct values and the code of each; None is encoded as -1"""
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return None if code < 0 else self.values[code]
+
+class LineItemColumns:
+    """Line items as parallel typed arrays; row i is (customer, day, cents, category, description) at index i"""
+    __slots__ = ('days', 'cents', 'customer_codes', 'category_codes', 'description_codes',
+                 '_customers', '_categories', '_descriptions')
+
+    def __init__(self):
+        self.days = array('i')
+        self.cents = array('q')
+        self.customer_codes = array('i')
+        self.category_codes = array('i')
+        self.description_codes = array('i')
+        self._customers = _Dictionary()
+        self._categories = _Dictionary()
+        self._descriptions = _Dictionary()
+
+    @property
+    def customers(self):
+        return self._customers.values
+
+    @property
+    def categories(self):
+        return self._categories.values
+
+    @property
+    def descriptions(self):
+        return self._descriptions.values
+
+    def __len__(self):
+        return len(self.days)
+
+    def append(self, customer_name, day, cents, category, description):
+        self.days.append(day)
+        self.cents.append(cents)
+        self.customer_codes.append(self._customers.encode(customer_name))
+        self.category_codes.append(self._categories.encode(category))
+        self.description_codes.append(self._descriptions.encode(description))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from rows with customer_name, day, cents, category and spend_description,
+        as yielded by document_store.load_line_item_columns' cursor"""
+        columns = cls()
+        append = columns.append
+        for row in rows:
+            day = row.get('day')
+            append(row.get('customer_name'), MISSING_DAY if day is None else day, row.get('cents') or 0,
+                   row.get('category'), row.get('spend_description'))
+        return columns
+
+    @classmethod
+    def from_items(cls, customer_name, spend_line_items):
+        """Build from one customer's line items as stored (spend_date, amount, category, spend_description)"""
+        columns = cls()
+        for item in spend_line_items:
+            amount = item.get('amount')
+            if hasattr(amount, 'to_decimal'):
+                amount = amount.to_decimal()
+            cents = int((Decimal(str(amount)) * 100).to_integral_value()) if amount is not None else 0
+            columns.append(customer_name, to_day(item.get('spend_date')), cents,
+                           item.get('category'), item.get('spend_description'))
+        return columns
+
+    @classmethod
+    def from_arrays(cls, days, cents, customer_codes, category_codes, description_codes,
+                    customers, categories, descriptions):
+        """Build from already encoded columns (NumPy arrays or sequences) and their distinct values"""
+        columns = cls()
+        for column, values in ((columns.days, days), (columns.cents, cents), (columns.customer_codes, customer_codes),
+                               (columns.category_codes, category_codes),
+                               (columns.description_codes, description_codes)):
+            if hasattr(values, 'astype'):
+                column.frombytes(values.astype(f'={column.typecode}').tobytes())
+            else:
+                column.extend(values)
+        for dictionary, values in ((columns._customers, customers), (columns._categories, categories),
+                                   (columns._descriptions, descriptions)):
+            for value in values:
+                dictionary.encode(value)
+        return columns
+
+    def nbytes(self):
+        """Bytes held by the arrays (the distinct strings are not counted)"""
+        return sum(column.itemsize * len(column) for column in
+                   (self.days, self.cents, self.customer_codes, self.category_codes, self.description_codes))
+
+    def row(self, index):
+        """Line item `index` decoded to a dict, with the amount in currency units"""
+        return {
+            'customer_name': self._customers.decode(self.customer_codes[index]),
+            'spend_date': from_day(self.days[index]),
+            'amount': self.cents[index] / 100,
+            'category': self._categories.decode(self.category_codes[index]),
+            'spend_description': self._descriptions.decode(self.description_codes[index]),
+        }
+
+    def to_numpy(self):
+        """The columns as NumPy arrays sharing memory with this container.
+
+        The container can't grow while these arrays are alive.
+        """
+        import numpy as np
+
+        return {
+            'days': np.frombuffer(self.days, dtype=np.int32),
+            'cents': np.frombuffer(self.cents, dtype=np.int64),
+            'customer_codes': np.frombuffer(self.customer_codes, dtype=np.int32),
+            'category_codes': np.frombuffer(self.category_codes, dtype=np.int32),
+            'description_codes': np.frombuffer(self.description_codes, dtype=np.int32),
+        }
+
+    def to_pandas(self):
+        """A DataFrame with one row per line item.
+
+        The cents column shares memory with this container; pandas narrows the
+        categorical codes and spend_date becomes datetime64 (it has no day resolution).
+        """
+        import numpy as np
+        import pandas as pd
+
+        arrays = self.to_numpy()
+        days = arrays['days']
+        spend_date = days.astype('datetime64[D]').astype('datetime64[s]')
+        missing = days == MISSING_DAY
+        if missing.any():
+            spend_date[missing] = np.datetime64('NaT')
+        return pd.DataFrame({
+            'customer_name': pd.Categorical.from_codes(arrays['customer_codes'], self.customers),
+            'spend_date': spend_date,
+            'cents': arrays['cents'],
+            'category': pd.Categorical.from_codes(arrays['category_codes'], self.categories),
+            'spend_description': pd.Categorical.from_codes(arrays['description_codes'], self.descriptions),
+        }, copy=False)
@@ -1,27 +1,18 @@
-from .text_extraction import extract_text_from_pdf
-import instructor
-from openai import OpenAI
-from pydantic import BaseModel, Field
-from pydantic_extra_types.phone_numbers import PhoneNumber
-from typing import Iterable
-
-from .fields_to_extract import CreditCardStatement
-from .client_request import parse_lead_from_message
+from . import metrics
+from .extraction_cache import file_sha256, cached_statement
 from .document_store import store_document, get_customer_spending_summary, save_document_pdf
 import csv
 import sys
 import os
 
-def main(input_doc_path):
-    """Process a PDF document and extract financial data"""
-    # Extract text from PDF
-    context_markdown = extract_text_from_pdf(input_doc_path)
-
-    # Parse the extracted text to get structured data
-    response = parse_lead_from_message(CreditCardStatement, context_markdown, model_name="openai")
+def finalize_statement(input_doc_path, response, content_hash=None):
+    """Store an extracted statement, write its CSV and print the customer summary.
 
+    Returns the CSV filename (None if there are no spend items), the spend line items
+    and the id of the stored document.
+    """
     # Store the document in the database with the PDF
-    stored_doc = store_document(input_doc_path, response, pdf_path=input_doc_path)
+    stored_doc = store_document(input_doc_path, response, pdf_path=input_doc_path, content_hash=content_hash)
     print(f"Document stored for customer: {stored_doc.customer_name}")
 
     # Get spend line items
@@ -34,24 +25,38 @@ def main(input_doc_path):
     # Save data to CSV
     with open(filename, mode='w', newline='') as file:
         if spend_line_items:
-            writer = csv.DictWriter(file, fieldnames=spend_line_items[0].keys())
-            writer.writeheader()
-            writer.writerows(spend_line_items)
+            with metrics.span('csv_write'):
+                writer = csv.DictWriter(file, fieldnames=spend_line_items[0].keys())
+                writer.writeheader()
+                writer.writerows(spend_line_items)
             print(f"CSV file created: {filename}")
             
             # Get and print spending summary
-            summary = get_customer_spending_summary(stored_doc.customer_name)
+            with metrics.span('summary'):
+                summary = get_customer_spending_summary(stored_doc.customer_name)
             print("\nCustomer Spending Summary:")
             print(f"Total Spend: ${summary['total_spend']:.2f}")
             print("\nCategory Breakdown:")
             for category, amount in summary['category_breakdown'].items():
                 print(f"{category}: ${amount:.2f}")
             
-            return filename, spend_line_items
+            return filename, spend_line_items, str(stored_doc.id)
         else:
             print("No spend_line_items found.")
-            return None, []
+            return None, [], str(stored_doc.id)
+
+def main(input_doc_path, model_name="openai", content_hash=None):
+    """Process a PDF document and extract financial data.
+
+    Pass `content_hash` if the PDF's SHA-256 is already known, to avoid reading it again.
+    """
+    with metrics.job_breakdown(input_doc_path):
+        # Re-uploads of the same PDF skip OCR and the LLM call entirely
+        content_hash = content_hash or file_sha256(input_doc_path)
+        response = cached_statement(input_doc_path, content_hash, model_name)
 
+        csv_filename, spend_line_items, _ = finalize_statement(input_doc_path, response, content_hash=content_hash)
+        return csv_filename, spend_line_items
 
 if __name__ == "__main__":
     input_doc_path = "pdfs/Amex.pdf"
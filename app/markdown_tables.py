@@ -0,0 +1,28 @@
+"""Helpers for the markdown tables in Docling output."""
+
+def is_table_row(line):
+    line = line.strip()
+    return line.startswith('|') and line.endswith('|')
+
+def is_separator_row(line):
+    return is_table_row(line) and set(line.replace(' ', '')) <= set('|-:')
+
+def cells(line):
+    return [cell.strip() for cell in line.strip()[1:-1].split('|')]
+
+def column_count(line):
+    return line.strip().count('|') - 1
+
+def split_blocks(markdown):
+    """Split markdown into alternating text and table blocks.
+
+    Returns (is_table, lines) pairs in document order.
+    """
+    blocks = []
+    for line in markdown.split('\n'):
+        is_table = is_table_row(line)
+        if blocks and blocks[-1][0] == is_table:
+            blocks[-1][1].append(line)
+        else:
+            blocks.append((is_table, [line]))
+    return blocks
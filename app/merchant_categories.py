@@ -0,0 +1,151 @@
+"""Merchant-to-category cache, so recurring merchants are categorized without the LLM.
+
+Descriptions are normalized to a merchant key (store numbers, processor
+prefixes and reference codes removed). Every category the LLM assigns to a
+merchant is counted as a vote in the `merchant_categories` Mongo collection; a
+merchant's category is its most voted one and its confidence the share of votes
+it got. Lookups go through an in-process LRU cache in front of Mongo.
+"""
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from . import metrics
+from .extraction_cache import LRUCache
+from .document_store import get_merchant_categories_collection, escape_field_name, unescape_field_name
+
+_log = logging.getLogger(__name__)
+
+# Cache settings - configure through the environment
+MERCHANT_CACHE_SIZE = int(os.getenv('MERCHANT_CACHE_SIZE', '10000'))
+# Seconds an entry is served from memory, so votes recorded by other processes are picked up
+MERCHANT_CACHE_TTL = float(os.getenv('MERCHANT_CACHE_TTL', '3600'))
+# Merchants below this confidence, or with fewer votes, are still sent to the LLM
+MERCHANT_MIN_CONFIDENCE = float(os.getenv('MERCHANT_MIN_CONFIDENCE', '0.6'))
+MERCHANT_MIN_VOTES = int(os.getenv('MERCHANT_MIN_VOTES', '1'))
+
+# Normalized merchant -> (category, confidence, votes)
+merchant_cache = LRUCache(maxsize=MERCHANT_CACHE_SIZE, ttl=MERCHANT_CACHE_TTL)
+
+_PROCESSOR_PREFIX_RE = re.compile(r'^(?:SQ|TST|SP|PP|PAYPAL|IC|DD|GOOGLE|APL)\s*\*\s*')
+# Store numbers like '#102', anywhere in the description
+_STORE_NUMBER_RE = re.compile(r'#\s*\w*\d\w*')
+_PUNCTUATION_RE = re.compile(r"[^\w&' ]+")
+# Trailing store numbers and reference codes: four or more digits, or long IDs mixing letters and digits
+_TRAILING_CODE_RE = re.compile(r'(?:\s+(?:\d{4,}|(?=\w*\d)(?=\w*[A-Z])\w{6,}))+$')
+
+_stats = {'hits': 0, 'misses': 0, 'low_confidence': 0}
+_stats_lock = threading.Lock()
+
+def normalize_merchant(description: str):
+    """Reduce a transaction description to a merchant key, e.g. 'SQ *Blue Bottle #12' -> 'BLUE BOTTLE'.
+
+    Only the processor prefix, store numbers and trailing reference codes are
+    removed, so 'UBER *TRIP' and 'UBER *EATS' stay apart.
+    """
+    text = ' '.join(description.upper().split())
+    text = _PROCESSOR_PREFIX_RE.sub('', text)
+    text = _STORE_NUMBER_RE.sub(' ', text)
+    text = _PUNCTUATION_RE.sub(' ', text)
+    text = _TRAILING_CODE_RE.sub('', ' ' + ' '.join(text.split()))
+    return text.strip()
+
+def _best(votes):
+    total = sum(votes.values())
+    if not total:
+        return None
+    field, count = max(votes.items(), key=lambda item: item[1])
+    return unescape_field_name(field), count / total, total
+
+def _count(result, amount=1):
+    with _stats_lock:
+        _stats[result] += amount
+    metrics.record_merchant_lookups(result, amount)
+
+def _load(keys):
+    """Read the votes for merchants missing from the in-process cache"""
+    try:
+        cursor = get_merchant_categories_collection().find({'_id': {'$in': list(keys)}}, {'votes': 1})
+        found = {doc['_id']: _best(doc.get('votes', {})) for doc in cursor}
+    except PyMongoError as e:
+        # The cache is an optimization; categorize with the LLM instead
+        _log.warning(f"Merchant category lookup failed: {e}")
+        return {}
+    for key, entry in found.items():
+        if entry is not None:
+            merchant_cache.put(key, entry)
+    return found
+
+def lookup_categories(descriptions):
+    """Return {description: category} for the descriptions whose merchant is known with enough confidence"""
+    keys = {description: normalize_merchant(description) for description in descriptions}
+    entries = {}
+    missing = set()
+    for key in set(keys.values()):
+        entry = merchant_cache.get(key)
+        if entry is None:
+            missing.add(key)
+        else:
+            entries[key] = entry
+    if missing:
+        entries.update(_load(missing))
+
+    categories = {}
+    for description, key in keys.items():
+        entry = entries.get(key)
+        if entry is None:
+            _count('misses')
+        elif entry[1] < MERCHANT_MIN_CONFIDENCE or entry[2] < MERCHANT_MIN_VOTES:
+            _count('low_confidence')
+        else:
+            _count('hits')
+            categories[description] = entry[0]
+    return categories
+
+def record_categories(categories, weight=1):
+    """Count {description: category} assignments as votes for their merchants.
+
+    Use a larger weight for categories confirmed by a person.
+    """
+    votes = {}
+    for description, category in categories.items():
+        key = normalize_merchant(description)
+        if key and category:
+            votes.setdefault(key, {})
+            votes[key][category] = votes[key].get(category, 0) + weight
+    if not votes:
+        return
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {'_id': key},
+            {
+                '$inc': {f'votes.{escape_field_name(category)}': count for category, count in merchant_votes.items()},
+                '$set': {'last_seen': now},
+            },
+            upsert=True,
+        )
+        for key, merchant_votes in votes.items()
+    ]
+    try:
+        get_merchant_categories_collection().bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        _log.warning(f"Recording merchant categories failed: {e}")
+    # Re-read on next use so the cached category reflects the new votes
+    for key in votes:
+        merchant_cache.invalidate(key)
+
+def merchant_cache_stats():
+    """Hit rate of merchant lookups, and the in-process LRU counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses'] + stats['low_confidence']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['memory'] = merchant_cache.stats()
+    return stats
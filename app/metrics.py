@@ -0,0 +1,184 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_log = logging.getLogger(__name__)
+
+# Turned off by default; when off, span() returns a shared no-op context manager
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+# Latency buckets in seconds, from fast Mongo reads up to long OCR runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histogram:
+    """Cumulative Prometheus-style histogram, one series per stage."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, value):
+        with self._lock:
+            series = self._series.get(stage)
+            if series is None:
+                series = self._series[stage] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for stage, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{stage="{stage}"}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{stage="{stage}"}} {series["count"]}')
+        return lines
+
+class Counter:
+    """Prometheus-style counter with a single label."""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value}')
+        return lines
+
+stage_latency = Histogram('pipeline_stage_seconds', 'Latency of each pipeline stage in seconds')
+llm_tokens = Counter('llm_tokens_total', 'LLM tokens sent and received', 'direction')
+pdf_pages = Counter('pdf_pages_total', 'PDF pages converted, by text-layer or OCR path', 'path')
+merchant_lookups = Counter('merchant_category_lookups_total', 'Merchant category cache lookups by result', 'result')
+results_cache = Counter('results_cache_total', 'Summary results cache hits, misses and evictions', 'result')
+
+# Stage timings of the job running in the current context, for the per-job log line;
+# executor threads share it through run_in_context
+_job_spans = contextvars.ContextVar('job_spans', default=None)
+_job_spans_lock = threading.Lock()
+
+# Callbacks that receive every raw (stage, seconds) observation, e.g. for benchmarks
+_listeners = []
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+def span(stage):
+    """Time a block of code as one observation of `stage`."""
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(stage)
+
+def record(stage, seconds):
+    """Record a duration measured elsewhere (e.g. Docling's own profiling)."""
+    if not METRICS_ENABLED:
+        return
+    stage_latency.observe(stage, seconds)
+    for listener in _listeners:
+        listener(stage, seconds)
+    spans = _job_spans.get()
+    if spans is not None:
+        with _job_spans_lock:
+            spans[stage] = spans.get(stage, 0.0) + seconds
+
+def run_in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, for executor.submit.
+
+    Stage timings recorded by the wrapped call then count towards the caller's
+    job_breakdown. Wrap once per submit: a context can't be entered by two threads.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def add_listener(listener):
+    """Call listener(stage, seconds) for every recorded observation."""
+    _listeners.append(listener)
+
+def record_tokens(prompt_tokens, completion_tokens):
+    if not METRICS_ENABLED:
+        return
+    if prompt_tokens:
+        llm_tokens.inc('in', prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc('out', completion_tokens)
+
+def record_pages(path, count):
+    if not METRICS_ENABLED:
+        return
+    if count:
+        pdf_pages.inc(path, count)
+
+def record_merchant_lookups(result, count=1):
+    if not METRICS_ENABLED:
+        return
+    merchant_lookups.inc(result, count)
+
+def record_results_cache(result, count=1):
+    if not METRICS_ENABLED:
+        return
+    if count:
+        results_cache.inc(result, count)
+
+@contextmanager
+def job_breakdown(job_name):
+    """Collect the stage timings recorded in this context and log them when the job ends.
+
+    Work submitted to executor threads is included if wrapped with run_in_context.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    token = _job_spans.set({})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = _job_spans.get()
+        _job_spans.reset(token)
+        breakdown = ', '.join(f"{stage}={seconds:.3f}s" for stage, seconds in spans.items())
+        _log.info(f"Job {job_name} took {time.perf_counter() - start:.3f}s: {breakdown}")
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    return '\n'.join(stage_latency.render() + llm_tokens.render() + pdf_pages.render()
+                     + merchant_lookups.render() + results_cache.render()) + '\n'
@@ -0,0 +1,98 @@
+"""One-off data migrations and maintenance commands for the documents collection.
+
+Usage:
+    python -m app.migrations pdf_blobs
+    python -m app.migrations decimal_amounts
+    python -m app.migrations indexes
+    python -m app.migrations check_plans
+    python -m app.migrations rollups
+"""
+import hashlib
+import io
+import sys
+
+from .document_store import get_documents_collection, store_pdf, ensure_indexes, check_query_plans, rebuild_customer_rollups
+
+def migrate_pdf_blobs(batch_size: int = 20):
+    """Move PDFs embedded in document records into GridFS.
+
+    Each record keeps only a `pdf_file_id` reference and its `content_hash`.
+    Records are processed one at a time, so at most one blob is held in memory.
+    """
+    migrated = 0
+    cursor = get_documents_collection().find(
+        {'pdf_content': {'$exists': True}},
+        {'filename': 1, 'pdf_content': 1, 'content_hash': 1},
+        batch_size=batch_size
+    )
+    for doc in cursor:
+        pdf_content = bytes(doc['pdf_content'])
+        content_hash = doc.get('content_hash') or hashlib.sha256(pdf_content).hexdigest()
+        pdf_file_id = store_pdf(io.BytesIO(pdf_content), doc['filename'], content_hash)
+        get_documents_collection().update_one(
+            {'_id': doc['_id']},
+            {
+                '$set': {'pdf_file_id': pdf_file_id, 'content_hash': content_hash},
+                '$unset': {'pdf_content': ''}
+            }
+        )
+        migrated += 1
+        print(f"Migrated PDF for: {doc['filename']}")
+    print(f"{migrated} documents migrated to GridFS")
+    return migrated
+
+def migrate_amounts_to_decimal():
+    """Convert string amounts in line items and payment info to Decimal128.
+
+    The conversion runs server-side as a single pipeline update.
+    """
+    to_decimal_items = {
+        '$map': {
+            'input': '$spend_line_items',
+            'as': 'item',
+            'in': {'$mergeObjects': ['$$item', {'amount': {'$toDecimal': '$$item.amount'}}]}
+        }
+    }
+    result = get_documents_collection().update_many(
+        {'$or': [
+            {'spend_line_items.amount': {'$type': 'string'}},
+            {'payment_info.new_balance': {'$type': 'string'}},
+            {'payment_info.minimum_payment': {'$type': 'string'}}
+        ]},
+        [{'$set': {
+            'spend_line_items': to_decimal_items,
+            'payment_info.new_balance': {'$toDecimal': '$payment_info.new_balance'},
+            'payment_info.minimum_payment': {'$toDecimal': '$payment_info.minimum_payment'}
+        }}]
+    )
+    print(f"{result.modified_count} documents converted to Decimal128 amounts")
+    return result.modified_count
+
+def create_indexes():
+    indexes = ensure_indexes()
+    print(f"Indexes on documents collection: {indexes}")
+
+def verify_query_plans():
+    queries = check_query_plans()
+    print(f"All {len(queries)} document queries use an index")
+
+def rebuild_rollups():
+    count = rebuild_customer_rollups()
+    print(f"Rebuilt spending rollups for {count} customers")
+
+MIGRATIONS = {
+    'pdf_blobs': migrate_pdf_blobs,
+    'decimal_amounts': migrate_amounts_to_decimal,
+    'indexes': create_indexes,
+    'check_plans': verify_query_plans,
+    'rollups': rebuild_rollups,
+}
+
+def main():
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        print(f"Usage: python -m app.migrations [{'|'.join(MIGRATIONS)}]")
+        sys.exit(1)
+    MIGRATIONS[sys.argv[1]]()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Bulk retrieval of a customer's PDFs, to a directory or as one streamed ZIP.
+
+Usage:
+    python -m app.pdf_retrieval "Joseph Paulson" retrieved_pdfs
+    python -m app.pdf_retrieval "Joseph Paulson" joseph.zip --zip
+
+Only document metadata is read up front; each PDF is then fetched exactly once,
+streamed from GridFS by a bounded pool of threads.
+"""
+import argparse
+import io
+import os
+import shutil
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .document_store import get_documents_collection, get_pdf_bucket, PDF_CHUNK_SIZE
+from .streams import ChunkSink
+
+# Concurrent GridFS downloads per retrieval
+PDF_RETRIEVAL_WORKERS = int(os.getenv('PDF_RETRIEVAL_WORKERS', '8'))
+
+class RetrievalStats:
+    """Files and bytes retrieved, and the resulting throughput"""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'seconds': elapsed,
+            'bytes_per_sec': self.bytes / elapsed,
+        }
+
+def get_customer_pdf_refs(customer_name: str):
+    """Metadata of a customer's documents that have a PDF: id, filename and GridFS file id.
+
+    Legacy records that still embed the PDF are flagged instead of returning the blob.
+    """
+    pipeline = [
+        {'$match': {'customer_name': customer_name}},
+        {'$project': {
+            'filename': 1,
+            'pdf_file_id': 1,
+            'embedded_pdf': {'$ne': [{'$type': '$pdf_content'}, 'missing']},
+        }},
+        {'$match': {'$or': [{'pdf_file_id': {'$exists': True}}, {'embedded_pdf': True}]}},
+    ]
+    return list(get_documents_collection().aggregate(pipeline))
+
+def _open_pdf(ref):
+    if ref.get('pdf_file_id'):
+        return get_pdf_bucket().open_download_stream(ref['pdf_file_id'])
+    # Record not yet migrated to GridFS
+    doc = get_documents_collection().find_one({'_id': ref['_id']}, {'_id': 0, 'pdf_content': 1})
+    return io.BytesIO(doc['pdf_content'])
+
+def _output_names(refs):
+    """A unique file name per document; repeated filenames get the document id appended"""
+    counts = {}
+    for ref in refs:
+        name = os.path.basename(ref['filename'])
+        counts[name] = counts.get(name, 0) + 1
+    names = []
+    for ref in refs:
+        name = os.path.basename(ref['filename'])
+        if counts[name] > 1:
+            stem, extension = os.path.splitext(name)
+            name = f"{stem}_{ref['_id']}{extension}"
+        names.append(name)
+    return names
+
+def save_customer_pdfs(customer_name: str, output_dir: str, workers: int = PDF_RETRIEVAL_WORKERS):
+    """Download a customer's PDFs into output_dir concurrently.
+
+    Returns the saved paths and the retrieval stats (files, bytes, seconds, bytes_per_sec).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    refs = get_customer_pdf_refs(customer_name)
+    stats = RetrievalStats()
+
+    def save(ref, name):
+        output_path = os.path.join(output_dir, name)
+        with _open_pdf(ref) as pdf_stream, open(output_path, 'wb') as f:
+            shutil.copyfileobj(pdf_stream, f, PDF_CHUNK_SIZE)
+            stats.add(f.tell())
+        return output_path
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pdf-retrieval') as executor:
+        paths = list(executor.map(save, refs, _output_names(refs)))
+    return paths, stats.summary()
+
+def _read_pdf(ref):
+    with _open_pdf(ref) as pdf_stream:
+        return pdf_stream.read()
+
+def iter_customer_pdfs_zip(customer_name: str, workers: int = PDF_RETRIEVAL_WORKERS, stats: RetrievalStats = None):
+    """Yield a ZIP of a customer's PDFs in pieces, for streaming to a client.
+
+    Up to `workers` PDFs are downloaded ahead of the one being written, so memory is
+    bounded by a few PDFs rather than the whole archive.
+    """
+    refs = get_customer_pdf_refs(customer_name)
+    stats = stats or RetrievalStats()
+    sink = ChunkSink()
+    # PDFs are already compressed, so store them as they are
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pdf-retrieval') as executor:
+        pending = deque()
+        entries = iter(zip(refs, _output_names(refs)))
+        for ref, name in entries:
+            pending.append((name, executor.submit(_read_pdf, ref)))
+            if len(pending) >= workers:
+                break
+        while pending:
+            name, future = pending.popleft()
+            next_entry = next(entries, None)
+            if next_entry is not None:
+                pending.append((next_entry[1], executor.submit(_read_pdf, next_entry[0])))
+            data = future.result()
+            with archive.open(name, 'w') as entry:
+                for start in range(0, len(data), PDF_CHUNK_SIZE):
+                    entry.write(data[start:start + PDF_CHUNK_SIZE])
+                    yield sink.drain()
+            stats.add(len(data))
+    archive.close()
+    yield sink.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieve all PDFs of a customer")
+    parser.add_argument('customer_name')
+    parser.add_argument('output', help="Output directory, or ZIP file with --zip")
+    parser.add_argument('--zip', action='store_true', help="Write a single ZIP file instead of a directory")
+    parser.add_argument('--workers', type=int, default=PDF_RETRIEVAL_WORKERS, help="Concurrent downloads")
+    args = parser.parse_args()
+
+    if args.zip:
+        stats = RetrievalStats()
+        with open(args.output, 'wb') as f:
+            for chunk in iter_customer_pdfs_zip(args.customer_name, args.workers, stats):
+                f.write(chunk)
+        summary = stats.summary()
+    else:
+        _, summary = save_customer_pdfs(args.customer_name, args.output, args.workers)
+    print(f"Retrieved {summary['files']} PDFs, {summary['bytes'] / 1024 / 1024:.1f} MB in {summary['seconds']:.2f}s "
+          f"({summary['bytes_per_sec'] / 1024 / 1024:.1f} MB/s)")
+
+if __name__ == "__main__":
+    main()
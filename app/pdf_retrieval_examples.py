@@ -1,5 +1,4 @@
-from document_store import get_document_pdf, save_document_pdf, get_documents_by_customer
-import os
+from .pdf_retrieval import save_customer_pdfs
 
 def retrieve_and_save_pdf(customer_name, output_dir="retrieved_pdfs"):
     """
@@ -9,28 +8,13 @@ def retrieve_and_save_pdf(customer_name, output_dir="retrieved_pdfs"):
         customer_name (str): Name of the customer
         output_dir (str): Directory to save the PDFs
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
+    # Only metadata is read up front; the PDFs are then downloaded concurrently, each once
+    saved_paths, stats = save_customer_pdfs(customer_name, output_dir)
     
-    # Get all documents for the customer
-    documents = get_documents_by_customer(customer_name)
-    
-    print(f"Found {len(documents)} documents for customer: {customer_name}")
-    
-    # Retrieve and save each PDF
-    for doc in documents:
-        # Get the PDF content
-        pdf_content = get_document_pdf(doc.filename)
-        
-        if pdf_content:
-            # Create output filename
-            output_path = os.path.join(output_dir, doc.filename)
-            
-            # Save the PDF
-            save_document_pdf(doc.filename, output_path)
-            print(f"Saved PDF to: {output_path}")
-        else:
-            print(f"No PDF found for document: {doc.filename}")
+    print(f"Found {len(saved_paths)} PDFs for customer: {customer_name}")
+    for output_path in saved_paths:
+        print(f"Saved PDF to: {output_path}")
+    print(f"Retrieved {stats['bytes'] / 1024 / 1024:.1f} MB at {stats['bytes_per_sec'] / 1024 / 1024:.1f} MB/s")
 
 def main():
     # Example usage
@@ -1,10 +1,11 @@
-from document_store import (
+from .document_store import (
     get_documents_by_customer,
     get_all_customers,
     get_customer_spending_summary,
     documents_collection
 )
 from datetime import datetime
+from bson import Decimal128
 import json
 
 def print_json(data):
@@ -38,10 +39,10 @@ def example_queries():
     high_spending_docs = documents_collection.find({
         "spend_line_items": {
             "$elemMatch": {
-                "amount": {"$gt": "1000.00"}
+                "amount": {"$gt": Decimal128("1000.00")}
             }
         }
-    })
+    }, {"_id": 0, "customer_name": 1, "filename": 1})
     print("\nDocuments with transactions over $1000:")
     for doc in high_spending_docs:
         print(f"Customer: {doc['customer_name']}")
@@ -55,7 +56,7 @@ def example_queries():
             "$gte": start_date,
             "$lte": end_date
         }
-    })
+    }, {"_id": 0, "customer_name": 1, "created_at": 1})
     print("\nDocuments from 2023:")
     for doc in date_range_docs:
         print(f"Customer: {doc['customer_name']}")
@@ -69,7 +70,7 @@ def example_queries():
                 "category": category
             }
         }
-    })
+    }, {"_id": 0, "customer_name": 1, "filename": 1})
     print(f"\nDocuments with {category} transactions:")
     for doc in category_docs:
         print(f"Customer: {doc['customer_name']}")
@@ -77,6 +78,7 @@ def example_queries():
 
     # Aggregate spending by category across all customers
     pipeline = [
+        {"$project": {"_id": 0, "spend_line_items.amount": 1, "spend_line_items.category": 1}},
         {"$unwind": "$spend_line_items"},
         {"$group": {
             "_id": "$spend_line_items.category",
@@ -1,12 +1,9 @@
-from document_store import (
+from .document_store import (
     get_all_customers,
-    get_customer_spending_summary,
-    get_documents_by_customer,
-    save_document_pdf
+    get_customer_spending_summary
 )
-import os
+from .pdf_retrieval import save_customer_pdfs
 from typing import List, Dict, Optional
-from datetime import datetime
 
 def list_all_customers() -> List[str]:
     """Get a list of all customers in the database."""
@@ -27,23 +24,11 @@ def retrieve_customer_documents(customer_name: str, output_dir: str = "retrieved
     Returns:
         List[str]: List of paths to saved documents
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Get all documents for the customer
-    documents = get_documents_by_customer(customer_name)
-    saved_paths = []
-    
-    for doc in documents:
-        # Create a timestamped filename to avoid overwrites
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"{timestamp}_{doc.filename}"
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # Save the document
-        if save_document_pdf(doc.filename, output_path):
-            saved_paths.append(output_path)
-    
+    # Metadata first, then each PDF streamed once by a pool of downloads
+    saved_paths, stats = save_customer_pdfs(customer_name, output_dir)
+    if saved_paths:
+        print(f"Retrieved {stats['bytes'] / 1024 / 1024:.1f} MB in {stats['seconds']:.2f}s "
+              f"({stats['bytes_per_sec'] / 1024 / 1024:.1f} MB/s)")
     return saved_paths
 
 def print_spending_summary(customer_name: str):
@@ -59,6 +44,38 @@ def print_spending_summary(customer_name: str):
     for category, amount in summary['category_breakdown'].items():
         print(f"{category:20} ${amount:10.2f}")
 
+def print_analytics():
+    """Print category totals, monthly trends, top merchants and customer percentiles across all customers."""
+    # Imported here so the menu starts without loading NumPy
+    from .analytics import load, category_totals, monthly_trends, top_merchants, customer_percentiles
+    
+    # Load every line item once and compute all reports from the same columns
+    columns = load()
+    
+    print(f"\nAnalytics across {len(columns.customers)} customers, {len(columns)} transactions")
+    print("=" * 50)
+    print("\nSpend by Category:")
+    print("-" * 30)
+    for row in category_totals(columns):
+        print(f"{row['category']:20} ${row['total']:12.2f} ({row['count']} transactions)")
+    
+    print("\nMonthly Spend:")
+    print("-" * 30)
+    for month, total in monthly_trends(columns).items():
+        print(f"{month:20} ${total:12.2f}")
+    
+    print("\nTop Merchants:")
+    print("-" * 30)
+    for row in top_merchants(columns):
+        print(f"{row['merchant'][:20]:20} ${row['total']:12.2f} ({row['count']} transactions)")
+    
+    print("\nCustomers:")
+    print("-" * 30)
+    for row in customer_percentiles(columns):
+        percentiles = ", ".join(f"{name} ${value:.2f}" for name, value in row['amount_percentiles'].items())
+        print(f"{row['customer_name'][:20]:20} ${row['total']:12.2f} "
+              f"(rank p{row['total_percentile_rank']:.0f}; transactions {percentiles})")
+
 def main():
     """Interactive command-line interface for document queries."""
     while True:
@@ -67,9 +84,10 @@ def main():
         print("1. List all customers")
         print("2. Get spending summary for a customer")
         print("3. Retrieve customer documents")
-        print("4. Exit")
+        print("4. Analytics across all customers")
+        print("5. Exit")
         
-        choice = input("\nEnter your choice (1-4): ")
+        choice = input("\nEnter your choice (1-5): ")
         
         if choice == "1":
             customers = list_all_customers()
@@ -94,6 +112,9 @@ def main():
                 print("No documents found for this customer.")
                 
         elif choice == "4":
+            print_analytics()
+            
+        elif choice == "5":
             print("Goodbye!")
             break
             
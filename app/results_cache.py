@@ -0,0 +1,269 @@
+"""Results cache for the summary reads in document_store.
+
+get_all_customers, get_customer_spending_summary and get_customer_monthly_spending
+are served from here until their entries expire (RESULTS_CACHE_TTL) or are
+evicted (least recently used beyond RESULTS_CACHE_SIZE). Writes through
+store_document, the bulk writer and rebuild_customer_rollups invalidate the
+entries of the customers they touch, plus the customer list.
+
+The default backend is in-process. With RESULTS_CACHE_BACKEND=sqlite, entries and
+counters live in a SQLite file (RESULTS_CACHE_PATH) shared by every worker on the
+host, so an invalidation in one gunicorn worker is seen by all of them.
+RESULTS_CACHE_BACKEND=off disables caching.
+
+Invalidations are remembered for one TTL, so a result computed before a write
+isn't stored after it; a computation started earlier than that isn't stored at all.
+"""
+import copy
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from . import metrics
+from .extraction_cache import LRUCache
+
+_log = logging.getLogger(__name__)
+
+# Cache settings - configure through the environment
+RESULTS_CACHE_BACKEND = os.getenv('RESULTS_CACHE_BACKEND', 'memory')
+RESULTS_CACHE_SIZE = int(os.getenv('RESULTS_CACHE_SIZE', '1024'))
+RESULTS_CACHE_TTL = float(os.getenv('RESULTS_CACHE_TTL', '300'))
+RESULTS_CACHE_PATH = os.getenv('RESULTS_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'results_cache.sqlite3'))
+
+# Cached results that belong to one customer; invalidated with that customer
+CUSTOMER_RESULTS = ('spending_summary', 'monthly_spending')
+ALL_CUSTOMERS = 'all_customers'
+
+def _key(kind, customer_name=None):
+    return kind if customer_name is None else f"{kind}:{customer_name}"
+
+class MemoryBackend:
+    """Per-process cache; results are copied in and out so callers can't modify cached values"""
+
+    def __init__(self, maxsize=RESULTS_CACHE_SIZE, ttl=RESULTS_CACHE_TTL):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # When each key was last invalidated, so results computed before a write aren't stored
+        self._invalidated_at = {}
+        self._cleared_at = 0.0
+        self._retention = ttl or RESULTS_CACHE_TTL
+        self._pruned_at = time.time()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        evictions = self._cache.evictions
+        value = self._cache.get(key)
+        metrics.record_results_cache('eviction', self._cache.evictions - evictions)
+        return None if value is None else copy.deepcopy(value)
+
+    def put(self, key, value, computed_at):
+        with self._lock:
+            if max(self._invalidated_at.get(key, 0.0), self._cleared_at) >= computed_at:
+                return
+            evictions = self._cache.evictions
+            self._cache.put(key, copy.deepcopy(value))
+        metrics.record_results_cache('eviction', self._cache.evictions - evictions)
+
+    def invalidate(self, keys):
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                self._invalidated_at[key] = now
+                self._cache.invalidate(key)
+            if now - self._pruned_at >= self._retention:
+                self._prune(now)
+
+    def _prune(self, now):
+        # Forget invalidations older than the retention; results computed before
+        # then are no longer stored at all
+        cutoff = now - self._retention
+        self._invalidated_at = {key: at for key, at in self._invalidated_at.items() if at >= cutoff}
+        self._cleared_at = max(self._cleared_at, cutoff)
+        self._pruned_at = now
+
+    def clear(self):
+        with self._lock:
+            self._cleared_at = time.time()
+            self._invalidated_at.clear()
+            self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+class SQLiteBackend:
+    """Cache shared by the processes on one host through a SQLite file; values are stored as JSON"""
+
+    def __init__(self, path=RESULTS_CACHE_PATH, maxsize=RESULTS_CACHE_SIZE, ttl=RESULTS_CACHE_TTL):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._retention = ttl or RESULTS_CACHE_TTL
+        self._pruned_at = time.time()
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS results '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            # When each key was last invalidated ('*' for a clear), so results computed before a write aren't stored
+            connection.execute('CREATE TABLE IF NOT EXISTS invalidations (key TEXT PRIMARY KEY, at REAL NOT NULL)')
+
+    def _connect(self):
+        # One connection per thread; SQLite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _count(connection, name, amount=1):
+        if amount:
+            connection.execute('INSERT INTO counters (name, value) VALUES (?, ?) '
+                               'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute('SELECT value, stored_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                self._count(connection, 'evictions')
+                metrics.record_results_cache('eviction')
+                row = None
+            if row is None:
+                self._count(connection, 'misses')
+                return None
+            connection.execute('UPDATE results SET used_at = ? WHERE key = ?', (now, key))
+            self._count(connection, 'hits')
+        return json.loads(row[0])
+
+    def put(self, key, value, computed_at):
+        now = time.time()
+        with self._connect() as connection:
+            invalidated_at = connection.execute("SELECT MAX(at) FROM invalidations WHERE key IN (?, '*')",
+                                                (key,)).fetchone()[0]
+            if invalidated_at is not None and invalidated_at >= computed_at:
+                return
+            connection.execute('INSERT OR REPLACE INTO results (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)',
+                               (key, json.dumps(value), now, now))
+            evicted = connection.execute(
+                'DELETE FROM results WHERE key IN '
+                '(SELECT key FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)', (self.maxsize,)).rowcount
+            self._count(connection, 'evictions', evicted)
+        metrics.record_results_cache('eviction', evicted)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(f"DELETE FROM results WHERE key IN ({', '.join('?' * len(keys))})", keys)
+            connection.executemany('INSERT OR REPLACE INTO invalidations (key, at) VALUES (?, ?)',
+                                   [(key, now) for key in keys])
+            if now - self._pruned_at >= self._retention:
+                self._prune(connection, now)
+
+    def _prune(self, connection, now):
+        # Forget invalidations older than the retention; raising the '*' record to
+        # the cutoff keeps results computed before then from being stored
+        cutoff = now - self._retention
+        connection.execute("DELETE FROM invalidations WHERE at < ? AND key != '*'", (cutoff,))
+        connection.execute("INSERT INTO invalidations (key, at) VALUES ('*', ?) "
+                           "ON CONFLICT(key) DO UPDATE SET at = MAX(at, excluded.at)", (cutoff,))
+        self._pruned_at = now
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute('DELETE FROM results')
+            connection.execute('DELETE FROM invalidations')
+            connection.execute("INSERT INTO invalidations (key, at) VALUES ('*', ?)", (time.time(),))
+
+    def stats(self):
+        connection = self._connect()
+        size = connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        counters = dict(connection.execute('SELECT name, value FROM counters').fetchall())
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The configured backend, created on first use; None when caching is off"""
+    global _backend
+    if _backend is None and RESULTS_CACHE_BACKEND != 'off':
+        with _backend_lock:
+            if _backend is None:
+                if RESULTS_CACHE_BACKEND == 'sqlite':
+                    _backend = SQLiteBackend()
+                elif RESULTS_CACHE_BACKEND == 'memory':
+                    _backend = MemoryBackend()
+                else:
+                    raise ValueError(f"Results cache backend {RESULTS_CACHE_BACKEND} not supported")
+    return _backend
+
+def cached_result(kind, customer_name, compute):
+    """Return the cached result for (kind, customer_name), computing and storing it on a miss.
+
+    customer_name is None for results that cover every customer. A failing cache is
+    bypassed; the result is computed instead.
+    """
+    backend = get_backend()
+    if backend is None:
+        return compute()
+    key = _key(kind, customer_name)
+    try:
+        value = backend.get(key)
+    except sqlite3.Error as e:
+        _log.warning(f"Results cache read failed: {e}")
+        return compute()
+    if value is not None:
+        metrics.record_results_cache('hit')
+        return value
+
+    metrics.record_results_cache('miss')
+    computed_at = time.time()
+    value = compute()
+    try:
+        backend.put(key, value, computed_at)
+    except sqlite3.Error as e:
+        _log.warning(f"Results cache write failed: {e}")
+    return value
+
+def invalidate_customers(customer_names):
+    """Drop the cached results of these customers, and the customer list they may have joined"""
+    backend = get_backend()
+    if backend is None:
+        return
+    keys = [ALL_CUSTOMERS]
+    for customer_name in set(customer_names):
+        keys.extend(_key(kind, customer_name) for kind in CUSTOMER_RESULTS)
+    try:
+        backend.invalidate(keys)
+    except sqlite3.Error as e:
+        _log.warning(f"Results cache invalidation failed: {e}")
+
+def clear_results():
+    backend = get_backend()
+    if backend is not None:
+        backend.clear()
+
+def results_cache_stats():
+    """Size, hits, misses, evictions and hit ratio of the results cache"""
+    backend = get_backend()
+    if backend is None:
+        return {'backend': 'off'}
+    return dict(backend.stats(), backend=RESULTS_CACHE_BACKEND)
@@ -0,0 +1,239 @@
+"""Rule-based parsing of the transaction tables in Docling markdown.
+
+Docling emits statement tables as markdown tables. Rows with a parseable date and
+a positive amount are read directly, so the LLM only has to fill in the header
+fields and categorize the descriptions.
+"""
+import re
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from .markdown_tables import cells, is_separator_row, split_blocks
+
+DATE_HEADERS = ('date', 'fecha', 'posted', 'trans')
+DESCRIPTION_HEADERS = ('description', 'descripción', 'descripcion', 'merchant', 'details', 'concepto', 'payee', 'transaction')
+AMOUNT_HEADERS = ('amount', 'importe', 'monto', 'charge', 'cargo', 'total', '$')
+# Headers of account summary tables (balance, minimum payment, due date), which are left to the LLM
+SUMMARY_HEADERS = ('balance', 'saldo', 'minimum', 'mínimo', 'minimo', 'due', 'vencimiento', 'limit', 'límite',
+                   'limite', 'payment', 'pago')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y')
+# Formats without a year, completed with the statement's most common year
+SHORT_DATE_FORMATS = ('%b %d', '%B %d', '%d %b')
+# Slash dates are read month first (US) or day first (most other locales), per table
+MONTH_FIRST_FORMATS = ('%m/%d/%Y', '%m/%d/%y')
+DAY_FIRST_FORMATS = ('%d/%m/%Y', '%d/%m/%y')
+SLASH_DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/\d{2,4})?$')
+SLASH_DATE_TOKEN_RE = re.compile(r'(?<![\d/])\d{1,2}/\d{1,2}(?:/\d{2,4})?(?![\d/])')
+
+AMOUNT_RE = re.compile(r'^\(?-?\s*[$€£]?\s*-?\s*\d{1,3}(?:[,\s]?\d{3})*(?:\.\d{2})\)?(?:\s*(?:CR|DR))?$', re.IGNORECASE)
+# Any printed amount, including formats AMOUNT_RE doesn't read (such as '1.234,56 €')
+LOOSE_AMOUNT_RE = re.compile(r'^\(?-?\s*[$€£]?\s*-?\s*\d[\d.,\s]*[.,]\d{2}\)?\s*[$€£]?(?:\s*(?:CR|DR))?$', re.IGNORECASE)
+YEAR_RE = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+# A table is only read directly if at least this share of its rows parse
+MIN_PARSED_ROW_RATIO = 0.8
+# Tables with fewer body rows are summaries, not transaction lists
+MIN_TABLE_ROWS = 2
+
+def statement_year(markdown):
+    """The most common four-digit year in the statement, for dates printed without one"""
+    years = Counter(YEAR_RE.findall(markdown))
+    return int(years.most_common(1)[0][0]) if years else date.today().year
+
+def slash_date_order(texts):
+    """'day_first' or 'month_first' if the slash dates among texts show their order, else None.
+
+    A first field above 12 can only be a day, a second field above 12 only a day
+    too; dates with both fields up to 12 say nothing.
+    """
+    day_first = month_first = False
+    for text in texts:
+        match = SLASH_DATE_RE.match(text.strip())
+        if match:
+            first, second = int(match.group(1)), int(match.group(2))
+            day_first |= first > 12
+            month_first |= second > 12
+    if day_first == month_first:
+        return None
+    return 'day_first' if day_first else 'month_first'
+
+def parse_date(text, default_year=None, day_first=False):
+    text = ' '.join(text.split())
+    slash_formats = DAY_FIRST_FORMATS if day_first else MONTH_FIRST_FORMATS
+    for fmt in slash_formats + DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    if default_year is not None:
+        short_slash_format = '%d/%m' if day_first else '%m/%d'
+        for fmt in (short_slash_format,) + SHORT_DATE_FORMATS:
+            try:
+                return datetime.strptime(f"{text} {default_year}", f"{fmt} %Y").date()
+            except ValueError:
+                pass
+    return None
+
+def parse_amount(text):
+    """Parse a printed amount; credits ('-', parentheses or CR) come back negative"""
+    text = text.strip()
+    if not AMOUNT_RE.match(text):
+        return None
+    negative = text.startswith('(') or '-' in text or text.upper().endswith('CR')
+    digits = re.sub(r'[^\d.]', '', text)
+    try:
+        value = Decimal(digits)
+    except InvalidOperation:
+        return None
+    return -value if negative else value
+
+def _header_column(header, keywords):
+    for index, cell in enumerate(header):
+        lowered = cell.lower()
+        if any(keyword in lowered for keyword in keywords):
+            return index
+    return None
+
+def _content_column(rows, predicate, exclude=()):
+    """The column whose cells most often satisfy predicate"""
+    best, best_count = None, 0
+    for index in range(max(len(row) for row in rows)):
+        if index in exclude:
+            continue
+        count = sum(1 for row in rows if index < len(row) and predicate(row[index]))
+        if count > best_count:
+            best, best_count = index, count
+    return best if best_count >= len(rows) / 2 else None
+
+def _is_summary_header(header):
+    """Whether most header cells name balances, payments or due dates"""
+    matches = sum(1 for cell in header if any(keyword in cell.lower() for keyword in SUMMARY_HEADERS))
+    return matches * 2 >= len(header)
+
+def _columns(header, rows, to_date):
+    """Locate the (date, description, amount) columns from header names, falling back to cell contents"""
+    date_col = _header_column(header, DATE_HEADERS) if header else None
+    if date_col is None or not any(to_date(row[date_col]) for row in rows if date_col < len(row)):
+        date_col = _content_column(rows, lambda cell: to_date(cell) is not None)
+    if date_col is None:
+        return None
+
+    amount_col = _header_column(header, AMOUNT_HEADERS) if header else None
+    if amount_col in (None, date_col):
+        amount_col = _content_column(rows, lambda cell: parse_amount(cell) is not None, exclude=(date_col,))
+    if amount_col is None:
+        return None
+
+    description_col = _header_column(header, DESCRIPTION_HEADERS) if header else None
+    if description_col in (None, date_col, amount_col):
+        # The widest remaining text column
+        widths = {}
+        for row in rows:
+            for index, cell in enumerate(row):
+                if index not in (date_col, amount_col) and parse_amount(cell) is None:
+                    widths[index] = widths.get(index, 0) + len(cell)
+        if not widths:
+            return None
+        description_col = max(widths, key=widths.get)
+    return date_col, description_col, amount_col
+
+def _table_cells(lines):
+    """(header, body rows) of a table; header is None if the table has no separator row"""
+    if len(lines) > 1 and is_separator_row(lines[1]):
+        header, body = cells(lines[0]), [cells(line) for line in lines[2:]]
+    else:
+        header, body = None, [cells(line) for line in lines]
+    return header, [row for row in body if any(row)]
+
+def _looks_like_transactions(lines, year):
+    """Whether a table has a row with a date and an amount and isn't an account summary"""
+    header, body = _table_cells(lines)
+    if not body or _is_summary_header(header if header is not None else body[0]):
+        return False
+    is_date = lambda cell: bool(SLASH_DATE_RE.match(cell)) or parse_date(cell, year) is not None
+    return any(any(map(is_date, row)) and any(LOOSE_AMOUNT_RE.match(cell) for cell in row) for row in body)
+
+def _parse_table(lines, year, statement_order=None):
+    """Return the purchase rows of a transaction table, or None if it isn't one.
+
+    Summary tables (balance, minimum payment, due date) and tables with fewer than
+    MIN_TABLE_ROWS rows are not read, so they stay in the text sent to the LLM.
+    Slash dates are read in the order the table's own dates show, else in
+    statement_order; if neither tells day from month, the table is left to the LLM.
+    """
+    header, body = _table_cells(lines)
+    if len(body) < MIN_TABLE_ROWS or _is_summary_header(header if header is not None else body[0]):
+        return None
+
+    all_cells = [cell for row in ([header] if header else []) + body for cell in row]
+    order = slash_date_order(all_cells) or statement_order
+    if order is None and any(SLASH_DATE_RE.match(cell) for cell in all_cells):
+        # Dates like 03/04 could be either; don't guess
+        return None
+    to_date = lambda text: parse_date(text, year, day_first=order == 'day_first')
+
+    columns = _columns(header, body, to_date)
+    if columns is None and header is not None:
+        columns = _columns(None, [header] + body, to_date)
+    if columns is None:
+        return None
+    date_col, description_col, amount_col = columns
+    # A description column of amounts means the columns were guessed from a summary table
+    descriptions = [row[description_col] for row in body if description_col < len(row)]
+    if sum(1 for cell in descriptions if parse_amount(cell) is not None) * 2 > len(descriptions):
+        return None
+
+    # Docling sometimes promotes the first data row of a page to a header
+    if header is not None and max(columns) < len(header) \
+            and to_date(header[date_col]) and parse_amount(header[amount_col]) is not None:
+        body = [header] + body
+
+    rows, parsed = [], 0
+    for row in body:
+        if max(columns) >= len(row):
+            continue
+        spend_date = to_date(row[date_col])
+        amount = parse_amount(row[amount_col])
+        if spend_date is None or amount is None:
+            continue
+        parsed += 1
+        # Payments and credits are not purchases
+        if amount > 0 and len(row[description_col]) >= 2:
+            rows.append({
+                'spend_date': spend_date,
+                'spend_description': row[description_col],
+                'amount': amount.quantize(Decimal('0.01')),
+            })
+    # Rows without any digits are repeated headers or section titles, not failed parses
+    candidates = sum(1 for row in body if any(ch.isdigit() for cell in row for ch in cell))
+    if parsed < MIN_PARSED_ROW_RATIO * candidates or not parsed:
+        return None
+    return rows
+
+def parse_transaction_tables(markdown):
+    """Split Docling markdown into directly parsed purchase rows and the remaining text.
+
+    Returns (rows, remaining_markdown, declined_tables). rows are dicts with spend_date,
+    spend_description and amount, in document order; remaining_markdown holds everything
+    that was not read as a transaction table (the header, summaries, non-transaction
+    tables). Tables without any purchase row (payments only) are kept in
+    remaining_markdown too. declined_tables lists the tables that look like
+    transactions but couldn't be read (a single row, ambiguous dates, other amount
+    formats); their purchases have to be extracted some other way.
+    """
+    year = statement_year(markdown)
+    blocks = split_blocks(markdown)
+    # Tables whose dates are all ambiguous take the order shown by the rest of the statement
+    statement_order = slash_date_order(SLASH_DATE_TOKEN_RE.findall(markdown))
+    rows, remaining, declined = [], [], []
+    for is_table, lines in blocks:
+        table_rows = _parse_table(lines, year, statement_order) if is_table else None
+        if table_rows is None and is_table and _looks_like_transactions(lines, year):
+            declined.append('\n'.join(lines))
+        if not table_rows:
+            remaining.extend(lines)
+        else:
+            rows.extend(table_rows)
+    return rows, '\n'.join(remaining), declined
@@ -0,0 +1,103 @@
+"""Cross-customer analytics latency at 100k and 10M line items.
+
+Builds synthetic line item columns directly with NumPy (customers, categories,
+merchants and dates drawn at random) and times every report in app.analytics,
+next to a per-item Python loop computing the category totals the way
+get_customer_spending_summary used to. The loop is skipped above
+--loop-max items. With --mongo, --mongo-items line items are also inserted for
+throwaway customers, and loading them with load_line_item_columns is timed
+against the server-side $group pipeline from query_examples (needs a running
+mongod, MONGODB_URI).
+
+Usage:
+    python -m benchmarks.analytics_scale --sizes 100000 10000000
+    python -m benchmarks.analytics_scale --sizes 100000 --mongo --mongo-items 100000
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from app import analytics
+from app.line_items import LineItemColumns
+
+CATEGORIES = ['Dining', 'Grocery', 'Travel', 'Shopping', 'Utilities', 'Entertainment', 'Other']
+
+def _columns(size, customers, merchants, seed=0):
+    rng = np.random.default_rng(seed)
+    return LineItemColumns.from_arrays(
+        days=rng.integers(19358, 19358 + 2 * 365, size),
+        cents=rng.integers(100, 50000, size),
+        customer_codes=rng.integers(0, customers, size),
+        category_codes=rng.integers(0, len(CATEGORIES), size),
+        description_codes=rng.integers(0, merchants, size),
+        customers=[f"Customer {i}" for i in range(customers)],
+        categories=CATEGORIES,
+        descriptions=[f"SQ *Merchant {chr(65 + i % 26)}{chr(65 + i // 26 % 26)} #{i}" for i in range(merchants)],
+    )
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def _loop_category_totals(columns):
+    totals = {}
+    for index in range(len(columns)):
+        item = columns.row(index)
+        totals[item['category']] = totals.get(item['category'], 0) + item['amount']
+    return totals
+
+def _mongo(items):
+    from app.document_store import get_documents_collection
+    from benchmarks.summary_latency import _seed
+
+    prefix = f"Benchmark Analytics {uuid.uuid4().hex[:8]}"
+    customers = [f"{prefix} {i}" for i in range(10)]
+    try:
+        for customer_name in customers:
+            _seed(customer_name, items // len(customers))
+        pipeline = [
+            {'$match': {'customer_name': {'$in': customers}}},
+            {'$project': {'_id': 0, 'spend_line_items.amount': 1, 'spend_line_items.category': 1}},
+            {'$unwind': '$spend_line_items'},
+            {'$group': {'_id': '$spend_line_items.category',
+                        'total_spend': {'$sum': {'$toDouble': '$spend_line_items.amount'}},
+                        'count': {'$sum': 1}}},
+        ]
+        server = _timed(lambda: list(get_documents_collection().aggregate(pipeline)))
+        start = time.perf_counter()
+        columns = analytics.load(customer_names=customers)
+        loaded = time.perf_counter() - start
+        reports = sum(_timed(report, columns) for report in analytics.REPORTS.values())
+        print(f"\nMongo, {items} items: $group category totals {server:.2f}s; "
+              f"load columns {loaded:.2f}s then all four reports {reports:.3f}s")
+    finally:
+        get_documents_collection().delete_many({'customer_name': {'$in': customers}})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 10_000_000])
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--merchants', type=int, default=5000)
+    parser.add_argument('--loop-max', type=int, default=1_000_000, help="Largest size to run the Python loop for")
+    parser.add_argument('--mongo', action='store_true')
+    parser.add_argument('--mongo-items', type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'items':>10} {'build s':>8} " + ' '.join(f"{name + ' s':>12}" for name in analytics.REPORTS)
+          + f" {'loop s':>8} {'MB':>6}")
+    for size in args.sizes:
+        start = time.perf_counter()
+        columns = _columns(size, args.customers, args.merchants)
+        built = time.perf_counter() - start
+        timings = [_timed(report, columns) for report in analytics.REPORTS.values()]
+        loop = f"{_timed(_loop_category_totals, columns):>8.2f}" if size <= args.loop_max else f"{'-':>8}"
+        print(f"{size:>10} {built:>8.2f} " + ' '.join(f"{timing:>12.3f}" for timing in timings)
+              + f" {loop} {columns.nbytes() / 1024 / 1024:>6.0f}")
+    if args.mongo:
+        _mongo(args.mongo_items)
+
+if __name__ == "__main__":
+    main()
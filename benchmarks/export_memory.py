@@ -0,0 +1,50 @@
+"""Peak memory of the streaming export as the number of exported rows grows.
+
+Seeds one customer step by step and exports its line items in every format to
+/dev/null, recording the peak Python allocation with tracemalloc. With a
+streaming export the peak stays flat as the row count grows. Needs a running
+mongod (MONGODB_URI); the benchmark customer is removed afterwards.
+
+Usage:
+    python -m benchmarks.export_memory --steps 10000 100000 500000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+import uuid
+
+from app.document_store import get_documents_collection
+from app.export import export_to_file
+from benchmarks.summary_latency import _seed
+
+def _measure(fmt, customer_name):
+    tracemalloc.start()
+    start = time.perf_counter()
+    export_to_file(os.devnull, fmt, customer_names=[customer_name])
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--formats', nargs='+', default=['csv', 'ndjson', 'parquet'])
+    args = parser.parse_args()
+
+    customer_name = f"Benchmark Export {uuid.uuid4().hex[:8]}"
+    seeded = 0
+    try:
+        print(f"{'rows':>10} {'format':>8} {'peak MB':>9} {'rows/s':>10}")
+        for target in sorted(args.steps):
+            _seed(customer_name, target - seeded)
+            seeded = target
+            for fmt in args.formats:
+                peak_mb, elapsed = _measure(fmt, customer_name)
+                print(f"{seeded:>10} {fmt:>8} {peak_mb:>9.1f} {seeded / elapsed:>10.0f}")
+    finally:
+        get_documents_collection().delete_many({'customer_name': customer_name})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""/get_data latency for a statement with many rows.
+
+"before" replays the old endpoint logic: read a CSV from disk, three groupbys and
+an iterrows() loop over every transaction, on every request. "after" calls the
+Mongo-backed endpoint uncached, cached, and with a matching ETag (304).
+Needs a running mongod (MONGODB_URI); the benchmark document is removed afterwards.
+
+Usage:
+    python -m benchmarks.get_data_latency --rows 10000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+from app import app
+from app.app import dashboard_cache
+from app.document_store import documents_collection, _to_decimal128
+from benchmarks.summary_latency import _line_items
+
+def _legacy_get_data(filename):
+    df = pd.read_csv(filename)
+    df.groupby('category')['amount'].sum().reset_index()
+    df['spend_date'] = pd.to_datetime(df['spend_date'], errors='coerce')
+    df = df.dropna(subset=['spend_date'])
+    df.groupby('spend_date')['amount'].sum().reset_index()
+    df.groupby('spend_description')['amount'].sum().reset_index().sort_values('amount', ascending=False).head(10)
+    transactions = []
+    for _, row in df.iterrows():
+        transactions.append({
+            'spend_date': row['spend_date'].strftime('%Y-%m-%d'),
+            'spend_description': row['spend_description'],
+            'amount': float(row['amount']),
+            'category': row['category']
+        })
+    return transactions
+
+def _percentiles(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=100)
+    args = parser.parse_args()
+
+    items = _line_items(args.rows, as_string=True)
+    client = app.test_client()
+    customer_name = f"Benchmark Dashboard {uuid.uuid4().hex[:8]}"
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'statement.csv')
+        pd.DataFrame(items).to_csv(csv_path, index=False)
+
+        result = documents_collection.insert_one({
+            'filename': 'benchmark.pdf',
+            'customer_name': customer_name,
+            'spend_line_items': [dict(item, amount=_to_decimal128(item['amount'])) for item in items],
+            'created_at': pd.Timestamp.utcnow().to_pydatetime(),
+            'updated_at': pd.Timestamp.utcnow().to_pydatetime()
+        })
+        url = f"/get_data/{result.inserted_id}"
+        try:
+            def uncached():
+                dashboard_cache.clear()
+                client.get(url)
+
+            etag = client.get(url).headers['ETag']
+            results = {
+                'before (CSV + iterrows)': _percentiles(lambda: _legacy_get_data(csv_path), args.runs),
+                'after, uncached': _percentiles(uncached, args.runs),
+                'after, cached': _percentiles(lambda: client.get(url), args.runs),
+                'after, 304': _percentiles(lambda: client.get(url, headers={'If-None-Match': etag}), args.runs),
+            }
+            for name, (p50, p99) in results.items():
+                print(f"{name:26} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+        finally:
+            documents_collection.delete_one({'_id': result.inserted_id})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Import-time budget for the web app and the CLIs.
+
+Imports each entry point in a fresh interpreter under `python -X importtime` and
+fails if its cumulative import time is over budget, or if it pulls in a heavy
+dependency that should only be loaded on first use.
+
+Usage:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --scale 2   # e.g. on a slow CI machine
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just by starting these entry points
+HEAVY_MODULES = ('torch', 'transformers', 'docling', 'sqlalchemy', 'instructor', 'openai', 'pandas')
+
+# (name, module to import, working directory, budget in ms)
+TARGETS = [
+    ('web app', 'app.app', ROOT, 1500),
+    # Importing app.query_interface starts the app package, web app included
+    ('query_interface', 'app.query_interface', ROOT, 1500),
+    ('migrations', 'app.migrations', ROOT, 800),
+]
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+def measure(module, cwd):
+    """Return the cumulative import time of `module` in ms and every module it imported"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total_us, imported = None, set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        imported.add(name)
+        # A submodule may be reported under its package or on its own line
+        if indent == 1 and name in (module, module.split('.')[0]):
+            total_us = max(total_us or 0, cumulative)
+    return (total_us or 0) / 1000, imported
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget by this factor")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'entry point':<18} {'import ms':>10} {'budget ms':>10}  heavy modules")
+    for name, module, cwd, budget_ms in TARGETS:
+        elapsed_ms, imported = measure(module, cwd)
+        heavy = sorted(heavy for heavy in HEAVY_MODULES if heavy in imported)
+        budget_ms *= args.scale
+        print(f"{name:<18} {elapsed_ms:>10.0f} {budget_ms:>10.0f}  {', '.join(heavy) or '-'}")
+        if elapsed_ms > budget_ms:
+            failures.append(f"{name}: {elapsed_ms:.0f}ms is over the {budget_ms:.0f}ms budget")
+        if heavy:
+            failures.append(f"{name}: imports {', '.join(heavy)} at startup")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Memory and build time of 1M line items: Document objects vs LineItemColumns.
+
+Measures with tracemalloc what each representation keeps alive and how long it
+takes to build from synthetic Mongo records: Document instances holding lists of
+dicts (the get_documents_by_customer path), and the columnar container. In
+memory, both timings include generating the records. Also times converting the
+columns to pandas and a per-category total. With --mongo the records are
+inserted for a throwaway customer and both representations are loaded from the
+database instead (needs a running mongod, MONGODB_URI).
+
+Usage:
+    python -m benchmarks.line_item_memory --items 1000000
+    python -m benchmarks.line_item_memory --items 1000000 --mongo
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from app.document_store import Document, get_documents_by_customer, get_documents_collection, load_line_item_columns
+from app.line_items import LineItemColumns
+from benchmarks.summary_latency import _line_items
+
+def _records(customer_name, items, per_document):
+    """Yield Mongo-shaped document records holding `items` line items in total"""
+    for i in range(0, items, per_document):
+        yield {
+            'filename': f"bench_{customer_name}_{i}.pdf",
+            'customer_name': customer_name,
+            'customer_address': '1 Benchmark Way',
+            'payment_info': {},
+            'spend_line_items': _line_items(min(per_document, items - i), as_string=False),
+            'created_at': datetime.utcnow(),
+        }
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained / 1024 / 1024, peak / 1024 / 1024, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--per-document', type=int, default=100)
+    parser.add_argument('--mongo', action='store_true', help="Load from MongoDB instead of in-memory records")
+    args = parser.parse_args()
+
+    customer_name = f"Benchmark Columns {uuid.uuid4().hex[:8]}"
+    if args.mongo:
+        get_documents_collection().insert_many(_records(customer_name, args.items, args.per_document))
+        build_documents = lambda: get_documents_by_customer(customer_name)
+        build_columns = lambda: load_line_item_columns(customer_names=[customer_name])
+    else:
+        build_documents = lambda: [Document.from_mongo(record)
+                                   for record in _records(customer_name, args.items, args.per_document)]
+        build_columns = lambda: LineItemColumns.from_items(customer_name, (
+            item for record in _records(customer_name, args.items, args.per_document)
+            for item in record['spend_line_items']))
+
+    try:
+        print(f"{'representation':<16} {'retained MB':>12} {'peak MB':>9} {'build s':>8}")
+        documents, retained, peak, elapsed = _measure(build_documents)
+        print(f"{'documents':<16} {retained:>12.1f} {peak:>9.1f} {elapsed:>8.2f}")
+        del documents
+
+        columns, retained, peak, elapsed = _measure(build_columns)
+        print(f"{'columns':<16} {retained:>12.1f} {peak:>9.1f} {elapsed:>8.2f}  ({columns.nbytes() / 1024 / 1024:.1f} MB of arrays)")
+
+        start = time.perf_counter()
+        frame = columns.to_pandas()
+        converted = time.perf_counter() - start
+        start = time.perf_counter()
+        totals = frame.groupby('category', observed=True)['cents'].sum()
+        grouped = time.perf_counter() - start
+        print(f"to_pandas {converted * 1000:.1f} ms, category totals {grouped * 1000:.1f} ms over {len(totals)} categories")
+    finally:
+        if args.mongo:
+            get_documents_collection().delete_many({'customer_name': customer_name})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Tokens and latency per document: table pre-parser vs the full-prompt path.
+
+Converts synthetic statements with Docling once, then extracts each one twice:
+with the LLM reproducing every row (preparse off) and with the rows read from
+the markdown tables, leaving the LLM the header and the categories (preparse on).
+Runs against the stub LLM unless --live is given, in which case the configured
+OpenAI/Ollama endpoint is used and real tokens are counted.
+
+Usage:
+    python -m benchmarks.preparse_tokens --docs 5 --pages 3 --transactions 120
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.stub_llm import start_server
+from benchmarks.synthetic_pdf import generate_corpus
+
+def _extract(markdown, model_name, preparse):
+    from app.client_request import extract_statement
+
+    report = []
+    start = time.perf_counter()
+    # Leave the merchant category collection alone, and have every run categorize with the LLM
+    statement = extract_statement(markdown, model_name=model_name, report=report, preparse=preparse,
+                                  use_merchant_cache=False)
+    elapsed = time.perf_counter() - start
+    tokens = sum((entry['prompt_tokens'] or 0) + (entry['completion_tokens'] or 0) for entry in report)
+    return statement, tokens, len(report), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--transactions', type=int, default=120)
+    parser.add_argument('--model', default="openai", choices=["openai", "ollama"])
+    parser.add_argument('--live', action='store_true', help="Use the configured LLM endpoint instead of the stub")
+    args = parser.parse_args()
+
+    if not args.live:
+        _, llm_base_url = start_server(0)
+        os.environ['OPENAI_BASE_URL'] = llm_base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+        os.environ['OLLAMA_BASE_URL'] = llm_base_url
+
+    from app.text_extraction import extract_text_from_pdf
+
+    with tempfile.TemporaryDirectory(prefix='preparse_bench_') as out_dir:
+        paths = generate_corpus(out_dir, args.docs, args.pages, args.transactions)
+        print(f"{'document':<20} {'rows':>5} {'full tokens':>12} {'full s':>7} "
+              f"{'pre tokens':>11} {'pre s':>7} {'requests':>9} {'saved':>6}")
+        totals = [0, 0.0, 0, 0.0]
+        for path in paths:
+            markdown = extract_text_from_pdf(path)
+            full, full_tokens, _, full_time = _extract(markdown, args.model, preparse=False)
+            pre, pre_tokens, requests, pre_time = _extract(markdown, args.model, preparse=True)
+            if len(pre.spend_line_items) != len(full.spend_line_items):
+                print(f"  {os.path.basename(path)}: {len(pre.spend_line_items)} pre-parsed rows "
+                      f"vs {len(full.spend_line_items)} from the LLM")
+            saved = 1 - pre_tokens / full_tokens if full_tokens else 0.0
+            print(f"{os.path.basename(path):<20} {len(pre.spend_line_items):>5} {full_tokens:>12} {full_time:>7.2f} "
+                  f"{pre_tokens:>11} {pre_time:>7.2f} {requests:>9} {saved:>6.0%}")
+            for index, value in enumerate((full_tokens, full_time, pre_tokens, pre_time)):
+                totals[index] += value
+        saved = 1 - totals[2] / totals[0] if totals[0] else 0.0
+        print(f"{'total':<20} {'':>5} {totals[0]:>12} {totals[1]:>7.2f} {totals[2]:>11} {totals[3]:>7.2f} {'':>9} {saved:>6.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Spending summary latency as a customer's history grows.
+
+Grows one customer's history step by step and times the rollup point read
+(get_customer_spending_summary) against a full aggregation over the history.
+Needs a running mongod (MONGODB_URI); the benchmark customer is removed afterwards.
+
+Usage:
+    python -m benchmarks.rollup_latency --steps 1000 10000 100000
+"""
+import argparse
+import uuid
+
+from app.document_store import (
+    documents_collection,
+    rollups_collection,
+    get_customer_spending_summary,
+    rebuild_customer_rollups,
+    _aggregate_spending_summary,
+)
+from benchmarks.summary_latency import _disable_results_cache, _seed, _time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    _disable_results_cache()
+
+    customer_name = f"Benchmark Rollup {uuid.uuid4().hex[:8]}"
+    seeded = 0
+    try:
+        print(f"{'line items':>12} {'rollup p50':>12} {'aggregate p50':>14}")
+        for target in sorted(args.steps):
+            _seed(customer_name, target - seeded)
+            seeded = target
+            rebuild_customer_rollups(customer_name)
+
+            rollup_p50, _ = _time(get_customer_spending_summary, customer_name, args.runs)
+            aggregate_p50, _ = _time(_aggregate_spending_summary, customer_name, args.runs)
+            print(f"{seeded:>12} {rollup_p50:>10.2f}ms {aggregate_p50:>12.2f}ms")
+    finally:
+        documents_collection.delete_many({'customer_name': customer_name})
+        rollups_collection.delete_one({'_id': customer_name})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""End-to-end pipeline benchmark on synthetic statements.
+
+Generates a corpus of synthetic statement PDFs, starts the stub LLM and runs
+every document through main.main, then the whole corpus through the batch
+ingestor (with the extraction caches cleared in between). Reports docs/sec,
+p50/p95 latency per pipeline stage and peak memory, and writes the results as
+JSON so runs can be compared.
+
+Docling runs for real; only the LLM is stubbed. Mongo is a local mongod
+(MONGODB_URI) using a throwaway database that is dropped afterwards, or
+mongomock with --mongo mongomock when no server is available. mongomock can't
+$inc Decimal128 values, so the customer rollups are kept as floats in that mode,
+and its GridFS emulation needs pymongo 3.x.
+
+Usage:
+    python -m benchmarks.run_pipeline --docs 20 --pages 3 --transactions 90 --out results.json
+    python -m benchmarks.run_pipeline --docs 20 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks.stub_llm import start_server
+from benchmarks.synthetic_pdf import generate_corpus
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class StageSamples:
+    """Every (stage, seconds) observation recorded while it is active"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {
+                    'count': len(values),
+                    'p50_ms': _percentile(values, 0.50) * 1000,
+                    'p95_ms': _percentile(values, 0.95) * 1000,
+                    'total_s': sum(values),
+                }
+                for stage, values in sorted(self.samples.items())
+            }
+
+def _peak_memory_mb():
+    # ru_maxrss is in KiB on Linux; children covers the OCR page pool
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {'self_mb': own / 1024, 'children_mb': children / 1024}
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _configure_environment(args, llm_base_url):
+    """Point the app at the stub LLM and a throwaway database; must run before app is imported"""
+    os.environ['OPENAI_BASE_URL'] = llm_base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    os.environ['OLLAMA_BASE_URL'] = llm_base_url
+    os.environ['METRICS_ENABLED'] = '1'
+    os.environ['MONGODB_DB'] = f"benchmark_{uuid.uuid4().hex[:8]}"
+    if args.mongo == 'mongomock':
+        import mongomock
+        import pymongo
+        from mongomock.gridfs import enable_gridfs_integration
+        if pymongo.version_tuple[0] >= 4:
+            sys.exit("--mongo mongomock needs pymongo 3.x; mongomock can't emulate GridFS for pymongo 4")
+        pymongo.MongoClient = mongomock.MongoClient
+        enable_gridfs_integration()
+        _use_float_rollups()
+
+def _use_float_rollups():
+    """Have the rollup updates $inc floats, as mongomock can't add Decimal128 values"""
+    from bson import Decimal128
+    from app import document_store
+
+    rollup_increments = document_store._rollup_increments
+    document_store._rollup_increments = lambda *args, **kwargs: {
+        field: float(value.to_decimal()) if isinstance(value, Decimal128) else value
+        for field, value in rollup_increments(*args, **kwargs).items()
+    }
+
+def _run_main(paths, model_name, samples):
+    from app import main as app_main
+
+    samples.reset()
+    latencies = []
+    start = time.perf_counter()
+    for path in paths:
+        doc_start = time.perf_counter()
+        app_main.main(path, model_name=model_name)
+        latencies.append(time.perf_counter() - doc_start)
+    elapsed = time.perf_counter() - start
+    return {
+        'docs': len(paths),
+        'elapsed_s': elapsed,
+        'docs_per_sec': len(paths) / elapsed,
+        'doc_p50_ms': _percentile(latencies, 0.50) * 1000,
+        'doc_p95_ms': _percentile(latencies, 0.95) * 1000,
+        'stages': samples.summary(),
+    }
+
+def _run_batch(paths, args, work_dir, samples):
+    from app.batch_ingest import BatchIngestor
+
+    samples.reset()
+    ingestor = BatchIngestor(
+        ocr_workers=args.ocr_workers,
+        llm_workers=args.llm_workers,
+        batch_size=args.batch_size,
+        model_name=args.model,
+        checkpoint_path=os.path.join(work_dir, 'checkpoint.txt'),
+        retry_path=os.path.join(work_dir, 'retry.jsonl'),
+    )
+    start = time.perf_counter()
+    stats = ingestor.run(paths)
+    elapsed = time.perf_counter() - start
+    return {
+        'docs': stats.docs,
+        'failures': stats.failures,
+        'pages': stats.pages,
+        'tokens': stats.tokens,
+        'elapsed_s': elapsed,
+        'docs_per_sec': stats.docs / elapsed,
+        'stages': samples.summary(),
+    }
+
+def _print_run(name, run):
+    print(f"\n{name}: {run['docs']} docs in {run['elapsed_s']:.1f}s ({run['docs_per_sec']:.2f} docs/sec)")
+    print(f"{'stage':<22} {'count':>6} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, values in run['stages'].items():
+        print(f"{stage:<22} {values['count']:>6} {values['p50_ms']:>10.1f} {values['p95_ms']:>10.1f}")
+
+def _print_comparison(results, baseline):
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for name in ('main', 'batch'):
+        old, new = baseline.get('runs', {}).get(name), results['runs'].get(name)
+        if not old or not new:
+            continue
+        change = (new['docs_per_sec'] / old['docs_per_sec'] - 1) * 100 if old['docs_per_sec'] else 0.0
+        print(f"{name}: {old['docs_per_sec']:.2f} -> {new['docs_per_sec']:.2f} docs/sec ({change:+.1f}%)")
+        for stage, values in new['stages'].items():
+            if stage in old['stages']:
+                print(f"  {stage:<20} p95 {old['stages'][stage]['p95_ms']:>9.1f} -> {values['p95_ms']:>9.1f} ms")
+    old_peak, new_peak = baseline.get('peak_memory', {}), results['peak_memory']
+    if old_peak:
+        print(f"peak memory: {old_peak['self_mb']:.0f} -> {new_peak['self_mb']:.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--transactions', type=int, default=60)
+    parser.add_argument('--model', default="openai", choices=["openai", "ollama"])
+    parser.add_argument('--mongo', default="local", choices=["local", "mongomock"])
+    parser.add_argument('--llm-latency', type=float, default=0.4, help="Stub LLM seconds per request")
+    parser.add_argument('--llm-per-token', type=float, default=0.002, help="Stub LLM seconds per completion token")
+    parser.add_argument('--ocr-workers', type=int, default=1)
+    parser.add_argument('--llm-workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--skip-main', action='store_true', help="Only benchmark the batch path")
+    parser.add_argument('--skip-batch', action='store_true', help="Only benchmark main.main")
+    parser.add_argument('--out', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    server, llm_base_url = start_server(0, args.llm_latency, args.llm_per_token)
+    _configure_environment(args, llm_base_url)
+
+    from app import metrics
+    from app.document_store import get_client, ensure_indexes, MONGODB_DB
+    from app.extraction_cache import markdown_cache, statement_cache
+
+    samples = StageSamples()
+    metrics.add_listener(samples)
+
+    results = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'compare')},
+        'runs': {},
+    }
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix='pipeline_bench_')
+    try:
+        paths = generate_corpus(os.path.join(work_dir, 'pdfs'), args.docs, args.pages, args.transactions)
+        ensure_indexes()
+        # main.main writes its CSVs to the working directory
+        os.chdir(work_dir)
+
+        if not args.skip_main:
+            results['runs']['main'] = _run_main(paths, args.model, samples)
+            _print_run('main.main', results['runs']['main'])
+        if not args.skip_batch:
+            markdown_cache.clear()
+            statement_cache.clear()
+            results['runs']['batch'] = _run_batch(paths, args, work_dir, samples)
+            _print_run('batch', results['runs']['batch'])
+    finally:
+        os.chdir(cwd)
+        get_client().drop_database(MONGODB_DB)
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results['peak_memory'] = _peak_memory_mb()
+    print(f"\npeak memory: {results['peak_memory']['self_mb']:.0f} MB "
+          f"(OCR workers {results['peak_memory']['children_mb']:.0f} MB)")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            _print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    sys.exit(main())
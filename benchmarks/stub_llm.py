@@ -0,0 +1,180 @@
+"""Local stand-in for the OpenAI and Ollama chat completion endpoints.
+
+Answers POST /v1/chat/completions with CreditCardStatement, StatementHeader,
+SpendItemList or CategorizedRows JSON built from the statement text in the
+prompt, after a delay that grows with the size of the answer like a real
+model's would. Requests with
+`tools` (the OpenAI backend) get a tool call back; the rest (the Ollama backend,
+JSON mode) get the JSON as message content.
+
+Usage:
+    python -m benchmarks.stub_llm --port 8765 --base-latency 0.4 --per-token 0.002
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic_pdf import MERCHANTS, FIRST_NAMES, LAST_NAMES
+
+ROW_RE = re.compile(r'(\d{2}/\d{2}/\d{4})\s*\|?\s*(.+?)\s*\|?\s*\$?\s*([\d,]+\.\d{2})\s*\|?\s*$')
+NAME_RE = re.compile(r'\b(?:%s) (?:%s)\b' % ('|'.join(FIRST_NAMES), '|'.join(LAST_NAMES)))
+BALANCE_RE = re.compile(r'New Balance:?\s*\|?\s*\$?([\d,]+\.\d{2})')
+MINIMUM_RE = re.compile(r'Minimum Payment Due:?\s*\|?\s*\$?([\d,]+\.\d{2})')
+DUE_DATE_RE = re.compile(r'Payment Due Date:?\s*\|?\s*(\d{2}/\d{2}/\d{4})')
+# Numbered descriptions; the first follows the instruction on the same line
+NUMBERED_RE = re.compile(r'(?:^|: )(\d+)\. (.+)$', re.MULTILINE)
+ADDRESS_RE = re.compile(r'(\d+ [A-Za-z ]+, ([A-Za-z ]+), [A-Z]{2} (\d{5}))')
+
+CATEGORIES = dict(MERCHANTS)
+
+def _iso(us_date):
+    return datetime.strptime(us_date, '%m/%d/%Y').date().isoformat()
+
+def _amount(text):
+    return text.replace(',', '')
+
+def _category(description):
+    for merchant, category in CATEGORIES.items():
+        if description.startswith(merchant):
+            return category
+    return 'Other'
+
+def _line_items(text):
+    items = []
+    for line in text.split('\n'):
+        match = ROW_RE.search(line.strip().strip('|'))
+        if match:
+            spend_date, description, amount = match.groups()
+            description = description.strip(' |')
+            items.append({
+                'spend_date': _iso(spend_date),
+                'spend_description': description,
+                'amount': _amount(amount),
+                'category': _category(description),
+            })
+    return items
+
+def _header(text):
+    name = NAME_RE.search(text)
+    address = ADDRESS_RE.search(text)
+    balance = BALANCE_RE.search(text)
+    minimum = MINIMUM_RE.search(text)
+    due_date = DUE_DATE_RE.search(text)
+    return {
+        'customer_name': name.group(0) if name else 'Benchmark Customer',
+        'customer_address': {
+            'full_address': address.group(1) if address else '1 Main Street, Springfield, IL 62701',
+            'city': address.group(2) if address else 'Springfield',
+            'zip': address.group(3) if address else '62701',
+        },
+        'payment_info': {
+            'new_balance': _amount(balance.group(1)) if balance else '100.00',
+            'minimum_payment': _amount(minimum.group(1)) if minimum else '25.00',
+            'due_date': _iso(due_date.group(1)) if due_date else '2024-12-31',
+        },
+    }
+
+def _requested_fields(payload):
+    """Which top-level fields the response model asks for"""
+    tools = payload.get('tools')
+    if tools:
+        function = tools[0]['function']
+        return function['name'], set(function.get('parameters', {}).get('properties', {}))
+    system = ' '.join(m.get('content') or '' for m in payload.get('messages', []) if m.get('role') == 'system')
+    fields = {field for field in ('customer_name', 'spend_line_items', 'categories') if f'"{field}"' in system}
+    return None, fields
+
+def build_answer(payload):
+    """The JSON answer for one chat completion request"""
+    user_text = '\n'.join(m.get('content') or '' for m in payload.get('messages', []) if m.get('role') == 'user')
+    _, fields = _requested_fields(payload)
+    if 'categories' in fields:
+        return {'categories': [{'id': int(number), 'category': _category(description)}
+                               for number, description in NUMBERED_RE.findall(user_text)]}
+    answer = {}
+    if 'customer_name' in fields or not fields:
+        answer.update(_header(user_text))
+    if 'spend_line_items' in fields or not fields:
+        answer['spend_line_items'] = _line_items(user_text)
+    return answer
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    base_latency = 0.4
+    per_token = 0.002
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        arguments = json.dumps(build_answer(payload))
+        prompt_tokens = sum(len(m.get('content') or '') for m in payload.get('messages', [])) // 4
+        completion_tokens = len(arguments) // 4
+        time.sleep(self.base_latency + self.per_token * completion_tokens)
+
+        tool_name, _ = _requested_fields(payload)
+        if tool_name:
+            message = {
+                'role': 'assistant',
+                'content': None,
+                'tool_calls': [{
+                    'id': f"call_{uuid.uuid4().hex[:12]}",
+                    'type': 'function',
+                    'function': {'name': tool_name, 'arguments': arguments},
+                }],
+            }
+            finish_reason = 'tool_calls'
+        else:
+            message = {'role': 'assistant', 'content': arguments}
+            finish_reason = 'stop'
+
+        body = json.dumps({
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': payload.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(port=0, base_latency=0.4, per_token=0.002):
+    """Serve the stub in a background thread; returns the server and its /v1 base URL"""
+    handler = type('ConfiguredStubLLMHandler', (StubLLMHandler,),
+                   {'base_latency': base_latency, 'per_token': per_token})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--base-latency', type=float, default=0.4, help="Seconds added to every request")
+    parser.add_argument('--per-token', type=float, default=0.002, help="Seconds added per completion token")
+    args = parser.parse_args()
+    server, base_url = start_server(args.port, args.base_latency, args.per_token)
+    print(f"Stub LLM listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Latency of the summary reads with and without the results cache.
+
+Seeds a few customers, then times get_all_customers and
+get_customer_spending_summary uncached, from the in-process cache and from the
+shared SQLite cache. It also checks that rebuilding a customer's rollup after
+adding documents invalidates the cached summary. Needs a running mongod (MONGODB_URI); the benchmark
+customers are removed afterwards.
+
+Usage:
+    python -m benchmarks.summary_cache --customers 20 --items 5000 --runs 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+from app import results_cache
+from app.document_store import (get_all_customers, get_customer_spending_summary, get_documents_collection,
+                                get_rollups_collection, rebuild_customer_rollups)
+from benchmarks.summary_latency import _seed
+
+def _p50_ms(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--items', type=int, default=5000, help="Line items per customer")
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    prefix = f"Benchmark Cache {uuid.uuid4().hex[:8]}"
+    customers = [f"{prefix} {i}" for i in range(args.customers)]
+    backends = {
+        'off': None,
+        'memory': results_cache.MemoryBackend(),
+        'sqlite': results_cache.SQLiteBackend(path=os.path.join(tempfile.mkdtemp(prefix='results_cache_'), 'cache.sqlite3')),
+    }
+    try:
+        for customer_name in customers:
+            _seed(customer_name, args.items)
+            rebuild_customer_rollups(customer_name)
+
+        print(f"{'backend':<8} {'customers p50 ms':>17} {'summary p50 ms':>15} {'hit ratio':>10}")
+        for name, backend in backends.items():
+            results_cache._backend = backend
+            results_cache.RESULTS_CACHE_BACKEND = name
+            customers_ms = _p50_ms(get_all_customers, args.runs)
+            summary_ms = _p50_ms(lambda: [get_customer_spending_summary(c) for c in customers], args.runs) / len(customers)
+            ratio = results_cache.results_cache_stats().get('hit_ratio', 0.0)
+            print(f"{name:<8} {customers_ms:>17.3f} {summary_ms:>15.3f} {ratio:>10.1%}")
+
+            if backend is not None:
+                # The rebuilt rollup must be visible on the next read
+                before = get_customer_spending_summary(customers[0])['total_spend']
+                _seed(customers[0], 10)
+                rebuild_customer_rollups(customers[0])
+                after = get_customer_spending_summary(customers[0])['total_spend']
+                print(f"{'':<8} invalidated on write: {'yes' if after != before else 'NO'}")
+    finally:
+        get_documents_collection().delete_many({'customer_name': {'$in': customers}})
+        get_rollups_collection().delete_many({'_id': {'$in': customers}})
+
+if __name__ == "__main__":
+    main()
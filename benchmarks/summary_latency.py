@@ -0,0 +1,92 @@
+"""Spending summary latency for a customer with many line items.
+
+Compares the old approach (string amounts summed with float() in Python) with
+Decimal128 amounts summed by a server-side aggregation. Needs a running mongod
+(MONGODB_URI); the benchmark customer is removed afterwards.
+
+Usage:
+    python -m benchmarks.summary_latency --items 10000
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app import results_cache
+from app.document_store import documents_collection, get_customer_spending_summary, _to_decimal128
+
+CATEGORIES = ['Dining', 'Grocery', 'Travel', 'Shopping', 'Utilities', 'Entertainment', 'Other']
+
+def _line_items(count, as_string):
+    start = datetime(2023, 1, 1)
+    items = []
+    for i in range(count):
+        amount = f"{random.uniform(1, 500):.2f}"
+        items.append({
+            'spend_date': start + timedelta(days=i % 365),
+            'spend_description': f"Merchant {i % 300}",
+            'amount': amount if as_string else _to_decimal128(amount),
+            'category': random.choice(CATEGORIES)
+        })
+    return items
+
+def _seed(customer_name, items, per_document=100, as_string=False):
+    all_items = _line_items(items, as_string)
+    documents_collection.insert_many([
+        {
+            'filename': f"bench_{customer_name}_{i}.pdf",
+            'customer_name': customer_name,
+            'spend_line_items': all_items[i:i + per_document],
+            'created_at': datetime.utcnow()
+        }
+        for i in range(0, items, per_document)
+    ])
+
+def _legacy_summary(customer_name):
+    # The pre-Decimal128 implementation: fetch everything and float() in Python
+    total_spend = 0
+    category_spend = {}
+    for doc in documents_collection.find({'customer_name': customer_name}):
+        for item in doc['spend_line_items']:
+            amount = float(item['amount'])
+            total_spend += amount
+            category_spend[item['category']] = category_spend.get(item['category'], 0) + amount
+    return total_spend, category_spend
+
+def _disable_results_cache():
+    # Time the reads themselves, not results cache hits
+    results_cache._backend = None
+    results_cache.RESULTS_CACHE_BACKEND = 'off'
+
+def _time(fn, customer_name, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(customer_name)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    _disable_results_cache()
+
+    before_customer = f"Benchmark Before {uuid.uuid4().hex[:8]}"
+    after_customer = f"Benchmark After {uuid.uuid4().hex[:8]}"
+    try:
+        _seed(before_customer, args.items, as_string=True)
+        _seed(after_customer, args.items, as_string=False)
+
+        p50, worst = _time(_legacy_summary, before_customer, args.runs)
+        print(f"before (string amounts, Python loop): p50 {p50:.1f} ms, max {worst:.1f} ms")
+        p50, worst = _time(get_customer_spending_summary, after_customer, args.runs)
+        print(f"after (Decimal128, $group):           p50 {p50:.1f} ms, max {worst:.1f} ms")
+    finally:
+        documents_collection.delete_many({'customer_name': {'$in': [before_customer, after_customer]}})
+
+if __name__ == "__main__":
+    main()
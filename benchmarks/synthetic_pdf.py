@@ -0,0 +1,148 @@
+"""Synthetic credit card statement PDFs for benchmarks.
+
+Writes born-digital PDFs (a text layer, no images) with a header block and a
+transaction table spread over the requested number of pages. No third-party
+dependencies are needed.
+
+Usage:
+    python -m benchmarks.synthetic_pdf out_dir --count 10 --pages 5 --transactions 200
+"""
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+MERCHANTS = [
+    ('Whole Foods Market', 'Grocery'), ('Trader Joes', 'Grocery'), ('Starbucks', 'Dining'),
+    ('Chipotle Mexican Grill', 'Dining'), ('Delta Air Lines', 'Travel'), ('Marriott Hotels', 'Travel'),
+    ('Shell Oil', 'Gas'), ('Amazon Marketplace', 'Shopping'), ('Target', 'Shopping'),
+    ('Netflix', 'Entertainment'), ('AMC Theatres', 'Entertainment'), ('Comcast', 'Utilities'),
+    ('CVS Pharmacy', 'Health'), ('Uber Trip', 'Travel'), ('The Home Depot', 'Home'),
+]
+FIRST_NAMES = ['Joseph', 'Maria', 'David', 'Linda', 'James', 'Ana', 'Robert', 'Sofia']
+LAST_NAMES = ['Paulson', 'Garcia', 'Smith', 'Johnson', 'Brown', 'Martinez', 'Lee', 'Walker']
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LINE_HEIGHT = 14
+TOP, BOTTOM = 740, 60
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _text(x, y, text, size=10):
+    return f"BT /F1 {size} Tf 1 0 0 1 {x} {y} Tm ({_escape(text)}) Tj ET"
+
+def make_statement(transactions=100, seed=None):
+    """Build the statement data: customer header fields and transaction rows."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1) + timedelta(days=rng.randint(0, 300))
+    rows = []
+    for _ in range(transactions):
+        merchant, category = rng.choice(MERCHANTS)
+        rows.append({
+            'spend_date': start + timedelta(days=rng.randint(0, 29)),
+            'spend_description': f"{merchant} #{rng.randint(100, 999)}",
+            'amount': f"{rng.uniform(2, 400):.2f}",
+            'category': category,
+        })
+    rows.sort(key=lambda row: row['spend_date'])
+    total = sum(float(row['amount']) for row in rows)
+    return {
+        'customer_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'full_address': f"{rng.randint(10, 9999)} Main Street, Springfield, IL 62701",
+        'city': 'Springfield',
+        'zip': '62701',
+        'new_balance': f"{total:.2f}",
+        'minimum_payment': f"{max(25, total * 0.02):.2f}",
+        'due_date': start + timedelta(days=55),
+        'rows': rows,
+    }
+
+def _page_streams(statement, pages):
+    header = [
+        _text(50, TOP, 'CREDIT CARD STATEMENT', 16),
+        _text(50, TOP - 24, statement['customer_name']),
+        _text(50, TOP - 38, statement['full_address']),
+        _text(350, TOP - 24, f"New Balance: ${statement['new_balance']}"),
+        _text(350, TOP - 38, f"Minimum Payment Due: ${statement['minimum_payment']}"),
+        _text(350, TOP - 52, f"Payment Due Date: {statement['due_date'].strftime('%m/%d/%Y')}"),
+    ]
+    table_top = {0: TOP - 90}
+    rows = statement['rows']
+    per_page = [0] * pages
+    for i in range(len(rows)):
+        per_page[i * pages // max(len(rows), 1)] += 1
+
+    streams, index = [], 0
+    for page in range(pages):
+        commands = list(header) if page == 0 else [_text(50, TOP, f"{statement['customer_name']} - page {page + 1}")]
+        y = table_top.get(page, TOP - 30)
+        commands += [_text(50, y, 'Date'), _text(140, y, 'Description'), _text(460, y, 'Amount')]
+        y -= LINE_HEIGHT
+        if y - per_page[page] * LINE_HEIGHT < BOTTOM:
+            raise ValueError(f"{len(rows)} transactions do not fit on {pages} pages; add pages")
+        for row in rows[index:index + per_page[page]]:
+            commands += [
+                _text(50, y, row['spend_date'].strftime('%m/%d/%Y')),
+                _text(140, y, row['spend_description']),
+                _text(460, y, f"${row['amount']}"),
+            ]
+            y -= LINE_HEIGHT
+            index += 1
+        streams.append('\n'.join(commands).encode('latin-1'))
+    return streams
+
+def write_pdf(path, statement, pages=1):
+    """Write a statement as a minimal text-only PDF."""
+    streams = _page_streams(statement, pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for stream in streams:
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode())
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(out)
+    return path
+
+def generate_corpus(out_dir, count=10, pages=2, transactions=60, seed=0):
+    """Write `count` statements to out_dir and return their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        statement = make_statement(transactions, seed=seed + i)
+        paths.append(write_pdf(os.path.join(out_dir, f"statement_{i:04d}.pdf"), statement, pages))
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=2)
+    parser.add_argument('--transactions', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = generate_corpus(args.out_dir, args.count, args.pages, args.transactions, args.seed)
+    print(f"Wrote {len(paths)} statements to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
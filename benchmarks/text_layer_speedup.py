@@ -0,0 +1,87 @@
+"""Per-document speedup of the text-layer fast path on a mixed corpus.
+
+Builds born-digital, fully scanned and mixed statements (scanned pages are
+rasterized to images, so they have no text layer) and converts each one with
+OCR on every page and then with the fast path, which only OCRs scanned pages.
+
+Usage:
+    python -m benchmarks.text_layer_speedup --docs 6 --pages 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pypdfium2 as pdfium
+
+from app.text_extraction import extract_text_from_pdf, probe_text_layer, warm_up
+from benchmarks.synthetic_pdf import make_statement, write_pdf
+
+def rasterize_pages(source_path, output_path, scanned_pages, scale=2):
+    """Copy a PDF, replacing the given pages (0-based) with image-only scans of themselves"""
+    source = pdfium.PdfDocument(source_path)
+    output = pdfium.PdfDocument.new()
+    try:
+        for index in range(len(source)):
+            if index not in scanned_pages:
+                output.import_pages(source, [index])
+                continue
+            page = source[index]
+            width, height = page.get_size()
+            bitmap = page.render(scale=scale)
+            new_page = output.new_page(width, height)
+            image = pdfium.PdfImage.new(output)
+            image.set_bitmap(bitmap)
+            image.set_matrix(pdfium.PdfMatrix().scale(width, height))
+            new_page.insert_obj(image)
+            new_page.gen_content()
+        output.save(output_path)
+    finally:
+        output.close()
+        source.close()
+    return output_path
+
+def build_corpus(out_dir, docs, pages, transactions):
+    """Born-digital, scanned and half-scanned statements in rotation"""
+    kinds = ('digital', 'scanned', 'mixed')
+    corpus = []
+    for i in range(docs):
+        kind = kinds[i % len(kinds)]
+        digital_path = write_pdf(os.path.join(out_dir, f"digital_{i:03d}.pdf"), make_statement(transactions, seed=i), pages)
+        if kind == 'digital':
+            corpus.append((kind, digital_path))
+            continue
+        scanned = set(range(pages)) if kind == 'scanned' else set(range(1, pages, 2))
+        corpus.append((kind, rasterize_pages(digital_path, os.path.join(out_dir, f"{kind}_{i:03d}.pdf"), scanned)))
+    return corpus
+
+def _time(path, fast_path):
+    start = time.perf_counter()
+    extract_text_from_pdf(path, fast_path=fast_path)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=6)
+    parser.add_argument('--pages', type=int, default=4)
+    parser.add_argument('--transactions', type=int, default=100)
+    args = parser.parse_args()
+
+    warm_up()
+    with tempfile.TemporaryDirectory(prefix='text_layer_bench_') as out_dir:
+        corpus = build_corpus(out_dir, args.docs, args.pages, args.transactions)
+        print(f"{'document':<18} {'text pages':>10} {'OCR pages':>10} {'all OCR':>9} {'fast path':>10} {'speedup':>8}")
+        total_ocr = total_fast = 0.0
+        for kind, path in corpus:
+            text_pages = sum(has_text for has_text, _ in probe_text_layer(path))
+            all_ocr = _time(path, fast_path=False)
+            fast = _time(path, fast_path=True)
+            total_ocr += all_ocr
+            total_fast += fast
+            name = f"{kind} {os.path.basename(path)[-7:-4]}"
+            print(f"{name:<18} {text_pages:>10} {args.pages - text_pages:>10} "
+                  f"{all_ocr:>8.2f}s {fast:>9.2f}s {all_ocr / fast:>7.1f}x")
+        print(f"{'total':<18} {'':>10} {'':>10} {total_ocr:>8.2f}s {total_fast:>9.2f}s {total_ocr / total_fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Peak server memory while uploading a large PDF.
+
+Starts the Flask app in a child process (with job submission disabled so only
+the upload path is measured), streams a synthetic upload to /upload and reports
+how much the server's peak RSS (VmHWM, Linux only) grew. Exits non-zero if the
+growth exceeds --max-growth-mb, so it can be used as a check.
+
+Usage:
+    python -m benchmarks.upload_memory --size-mb 50
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+SERVER = """
+import importlib
+# app/__init__ re-exports the Flask object as app.app, so import the module explicitly
+web = importlib.import_module('app.app')
+web.submit_job = lambda filepath, **kwargs: 'benchmark'
+web.app.run(port={port}, threaded=True)
+"""
+
+def _peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available")
+
+def _wait_for_server(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError("Server did not start")
+
+def _stream_upload(port, path, chunk_size=1024 * 1024):
+    boundary = uuid.uuid4().hex
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"large.pdf\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n").encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+
+    def body():
+        yield head
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+        yield tail
+
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    conn.request('POST', '/upload', body=body(), headers={
+        'Content-Type': f"multipart/form-data; boundary={boundary}",
+        'Content-Length': str(len(head) + os.path.getsize(path) + len(tail)),
+        'Accept': 'application/json',
+    })
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=50)
+    parser.add_argument('--max-growth-mb', type=float, default=20)
+    parser.add_argument('--port', type=int, default=5057)
+    args = parser.parse_args()
+
+    env = dict(os.environ, MAX_UPLOAD_MB=str(args.size_mb + 1))
+    server = subprocess.Popen([sys.executable, '-c', SERVER.format(port=args.port)], env=env)
+    try:
+        _wait_for_server(args.port)
+        baseline = _peak_rss_mb(server.pid)
+
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as upload:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                upload.write(chunk)
+            upload.flush()
+            status = _stream_upload(args.port, upload.name)
+
+        growth = _peak_rss_mb(server.pid) - baseline
+        print(f"upload of {args.size_mb} MB -> HTTP {status}, server peak RSS grew {growth:.1f} MB")
+        if status != 202 or growth > args.max_growth_mb:
+            print(f"FAIL: expected HTTP 202 and growth under {args.max_growth_mb} MB")
+            sys.exit(1)
+        print("OK")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
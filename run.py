@@ -1,4 +1,19 @@
+import os
+import threading
+
 from app import app
+from app.document_store import ensure_indexes
+
+DEBUG = True
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # With the reloader, this module runs in a watcher process and again in the
+    # serving process (WERKZEUG_RUN_MAIN set); only the serving one warms up
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN'):
+        # Make sure the query indexes exist before serving requests
+        ensure_indexes()
+        # Load Docling and its OCR and table models in the background; uploads that
+        # arrive first wait for the converter instead of the whole server waiting
+        from app.text_extraction import warm_up
+        threading.Thread(target=warm_up, daemon=True).start()
+    app.run(debug=DEBUG)
@@ -0,0 +1,29 @@
+import os
+import uuid
+
+import pytest
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """Point document_store at a throwaway database, dropped afterwards; skips without a reachable mongod"""
+    pymongo = pytest.importorskip('pymongo')
+    from pymongo.errors import PyMongoError
+
+    from app import document_store
+
+    client = pymongo.MongoClient(document_store.MONGODB_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no MongoDB server at {document_store.MONGODB_URI}")
+
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(document_store, 'MONGODB_DB', name)
+    monkeypatch.setattr(document_store, '_client', client)
+    monkeypatch.setattr(document_store, '_pdf_bucket', None)
+    try:
+        yield client[name]
+    finally:
+        client.drop_database(name)
+        client.close()
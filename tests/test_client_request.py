@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('instructor')
+pytest.importorskip('pymongo')
+
+from app import client_request
+from app.fields_to_extract import CategorizedRows, RowCategory, SpendItem, SpendItemList, StatementHeader
+
+STATEMENT = """Joseph Paulson
+1 Main Street, Springfield 12345
+
+| Payment Due Date | New Balance | Minimum Payment |
+|---|---|---|
+| 02/15/2024 | $498.63 | $35.00 |
+
+| Date | Description | Amount |
+|---|---|---|
+| 01/03/2024 | BLUE BOTTLE COFFEE | $4.50 |
+| 01/05/2024 | WHOLE FOODS #102 | $82.13 |
+
+Page 2
+
+| Date | Description | Amount |
+|---|---|---|
+| 01/22/2024 | DELTA AIR LINES | $412.00 |"""
+
+def _fake_create_with_usage(pydantic_model, instruction, user_message, model_name):
+    stats = {'latency': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0}
+    if pydantic_model is StatementHeader:
+        return StatementHeader(
+            customer_name='Joseph Paulson',
+            customer_address={'full_address': '1 Main Street, Springfield 12345', 'city': 'Springfield', 'zip': '12345'},
+            payment_info={'new_balance': '498.63', 'minimum_payment': '35.00', 'due_date': date(2024, 2, 15)},
+        ), stats
+    if pydantic_model is CategorizedRows:
+        count = len(user_message.splitlines())
+        return CategorizedRows(categories=[RowCategory(id=i, category='Other') for i in range(1, count + 1)]), stats
+    items = []
+    if 'DELTA AIR LINES' in user_message:
+        items.append(SpendItem(spend_date=date(2024, 1, 22), spend_description='DELTA AIR LINES',
+                               amount=Decimal('412.00'), category='Travel'))
+    return SpendItemList(spend_line_items=items), stats
+
+def test_tables_the_parser_declines_are_extracted_by_the_llm(monkeypatch):
+    monkeypatch.setattr(client_request, '_create_with_usage', _fake_create_with_usage)
+    statement = client_request.extract_statement(STATEMENT, preparse=True, use_merchant_cache=False)
+    assert [item.spend_description for item in statement.spend_line_items] == \
+        ['BLUE BOTTLE COFFEE', 'WHOLE FOODS #102', 'DELTA AIR LINES']
@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('pymongo')
+
+from benchmarks.import_budget import HEAVY_MODULES, TARGETS, measure
+
+# Multiply every budget by this factor, e.g. on a slow CI machine
+SCALE = float(os.getenv('IMPORT_BUDGET_SCALE', '1'))
+
+@pytest.mark.parametrize('name, module, cwd, budget_ms', TARGETS, ids=[target[0] for target in TARGETS])
+def test_entry_point_starts_within_budget(name, module, cwd, budget_ms):
+    elapsed_ms, imported = measure(module, cwd)
+    assert elapsed_ms <= budget_ms * SCALE
+    assert [heavy for heavy in HEAVY_MODULES if heavy in imported] == []
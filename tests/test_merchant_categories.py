@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('pymongo')
+
+from app.merchant_categories import normalize_merchant
+
+@pytest.mark.parametrize('description, merchant', [
+    ('SQ *Blue Bottle #12', 'BLUE BOTTLE'),
+    ('WHOLE FOODS #102 AUSTIN TX', 'WHOLE FOODS AUSTIN TX'),
+    ('WALGREENS 0423', 'WALGREENS'),
+    ('AMZN MKTP US*2K4AB12C0', 'AMZN MKTP US'),
+    ('UBER *TRIP', 'UBER TRIP'),
+    ('UBER *EATS', 'UBER EATS'),
+    ('SHOP 3', 'SHOP 3'),
+])
+def test_normalize_merchant(description, merchant):
+    assert normalize_merchant(description) == merchant
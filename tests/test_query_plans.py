@@ -0,0 +1,20 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('pymongo')
+
+from app.document_store import DOCUMENT_INDEXES, check_query_plans, ensure_indexes
+
+def test_document_queries_use_an_index(mongo_db):
+    mongo_db.documents.insert_one({
+        'filename': 'statement.pdf',
+        'customer_name': 'Joseph Paulson',
+        'content_hash': 'a' * 64,
+        'spend_line_items': [{'spend_date': datetime(2024, 1, 3), 'spend_description': 'BLUE BOTTLE',
+                              'amount': 4.5, 'category': 'Dining'}],
+        'created_at': datetime(2024, 1, 31),
+    })
+    assert set(ensure_indexes()) >= {name for name, _, _ in DOCUMENT_INDEXES}
+    # Raises if any of them falls back to a COLLSCAN
+    check_query_plans()
@@ -0,0 +1,74 @@
+from datetime import date
+from decimal import Decimal
+
+from app.table_parser import parse_transaction_tables
+
+TRANSACTIONS = """| Date | Description | Amount |
+|---|---|---|
+| 01/03/2024 | BLUE BOTTLE COFFEE | $4.50 |
+| 01/05/2024 | WHOLE FOODS #102 | $82.13 |
+| 01/19/2024 | PAYMENT THANK YOU | -$500.00 |"""
+
+SUMMARY = """| Payment Due Date | New Balance | Minimum Payment |
+|---|---|---|
+| 02/15/2024 | $1,234.56 | $35.00 |"""
+
+def test_reads_transaction_table():
+    rows, remaining, _ = parse_transaction_tables(TRANSACTIONS)
+    assert rows == [
+        {'spend_date': date(2024, 1, 3), 'spend_description': 'BLUE BOTTLE COFFEE', 'amount': Decimal('4.50')},
+        {'spend_date': date(2024, 1, 5), 'spend_description': 'WHOLE FOODS #102', 'amount': Decimal('82.13')},
+    ]
+    assert 'BLUE BOTTLE' not in remaining
+
+def test_summary_table_is_left_to_the_llm():
+    markdown = f"Statement for Joseph Paulson\n\n{SUMMARY}\n\n{TRANSACTIONS}"
+    rows, remaining, declined = parse_transaction_tables(markdown)
+    assert [row['spend_description'] for row in rows] == ['BLUE BOTTLE COFFEE', 'WHOLE FOODS #102']
+    assert SUMMARY in remaining
+    assert declined == []
+
+def test_single_row_table_is_not_read():
+    markdown = "| Date | Description | Amount |\n|---|---|---|\n| 01/03/2024 | BLUE BOTTLE COFFEE | $4.50 |"
+    rows, remaining, declined = parse_transaction_tables(markdown)
+    assert rows == []
+    assert remaining == markdown
+    assert declined == [markdown]
+
+def test_table_of_amounts_is_not_read():
+    markdown = "| 02/15/2024 | $1,234.56 | $35.00 |\n| 03/15/2024 | $1,100.00 | $30.00 |"
+    rows, remaining, _ = parse_transaction_tables(markdown)
+    assert rows == []
+    assert remaining == markdown
+
+def test_day_first_dates_are_detected_per_table():
+    markdown = """| Fecha | Concepto | Importe |
+|---|---|---|
+| 03/01/2024 | MERCADONA | -45.10 |
+| 25/01/2024 | REPSOL | 60.00 |
+| 05/02/2024 | EL CORTE INGLES | 120.00 |"""
+    rows, _, _ = parse_transaction_tables(markdown)
+    assert [row['spend_date'] for row in rows] == [date(2024, 1, 25), date(2024, 2, 5)]
+
+def test_ambiguous_table_takes_the_statement_order():
+    markdown = "Fecha de cargo: 28/02/2024\n\n| Fecha | Concepto | Importe |\n|---|---|---|\n" \
+               "| 03/02/2024 | MERCADONA | 45.10 |\n| 05/02/2024 | REPSOL | 60.00 |"
+    rows, _, _ = parse_transaction_tables(markdown)
+    assert [row['spend_date'] for row in rows] == [date(2024, 2, 3), date(2024, 2, 5)]
+
+def test_ambiguous_dates_are_left_to_the_llm():
+    markdown = "| Date | Description | Amount |\n|---|---|---|\n" \
+               "| 03/04/2024 | SHOP A | 10.00 |\n| 05/06/2024 | SHOP B | 20.00 |"
+    rows, remaining, _ = parse_transaction_tables(markdown)
+    assert rows == []
+    assert remaining == markdown
+
+def test_partially_parsed_statement_reports_the_declined_tables():
+    page_two = "| Date | Description | Amount |\n|---|---|---|\n| 01/22/2024 | DELTA AIR LINES | $412.00 |"
+    european = "| Fecha | Concepto | Importe |\n|---|---|---|\n" \
+               "| 25/01/2024 | REPSOL | 1.060,00 € |\n| 26/01/2024 | MERCADONA | 45,10 € |"
+    markdown = f"{SUMMARY}\n\n{TRANSACTIONS}\n\nPage 2\n\n{page_two}\n\n{european}"
+    rows, remaining, declined = parse_transaction_tables(markdown)
+    assert [row['spend_description'] for row in rows] == ['BLUE BOTTLE COFFEE', 'WHOLE FOODS #102']
+    assert declined == [page_two, european]
+    assert page_two in remaining and european in remaining
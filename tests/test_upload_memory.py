@@ -0,0 +1,23 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip('flask')
+pytest.importorskip('pymongo')
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason="peak RSS is read from /proc")
+def test_large_upload_is_streamed_to_disk(tmp_path):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # Exits non-zero if the upload fails or the server's peak RSS grows more than 20 MB
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.upload_memory', '--size-mb', '50', '--port', str(port)],
+        cwd=tmp_path, env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr